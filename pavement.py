@@ -6,14 +6,16 @@ solar physics using the Python programming language.
 """
 #pylint: disable=W0404,W0621
 import os
-import imp
+import sys
+import errno
 import shutil
+import filecmp
 from paver.easy import *
 from paver.setuputils import setup
 
-# This is not pretty, but necessary
-install = imp.load_source(
-    'setup', os.path.join(os.path.dirname(__file__), 'setup.py')).install
+# setup.py only runs setup() when executed, so it can be imported directly
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from setup import install
 
 #
 # Options
@@ -24,7 +26,7 @@ options(
         host = 'sipwork.org',
         hostpath = 'www/sunpy/doc'
     ),
-    sphinx = Bunch(docroot='doc/source', builddir="_build"),
+    sphinx = Bunch(docroot='doc/source', builddir="_build", jobs='auto'),
     upload_docs = Bunch(upload_dir='doc/html'),
     pylint = Bunch(quiet=False)
 )
@@ -39,29 +41,60 @@ install(setup)
 @needs('prepare_docs', 'setuptools.command.sdist')
 def sdist():
     """Generated HTML docs and builds a tarball."""
-    shutil.rmtree('doc/html')
     
 @task
 @needs('prepare_docs', 'setuptools.command.bdist_wininst')
 def bdist():
     """Generated HTML docs and builds a windows binary."""
-    shutil.rmtree('doc/html')
 
 #
 # Documentation
 #
 @task
-@needs('paver.doctools.html')
+def build_html(options):
+    """Builds the HTML documentation, running Sphinx in parallel.
+    
+    Sphinx uses one process per CPU by default; set SUNPY_SPHINX_JOBS to use
+    a different number."""
+    jobs = os.environ.get('SUNPY_SPHINX_JOBS', options.sphinx.jobs)
+    docroot = path(options.sphinx.docroot)
+    builddir = docroot / options.sphinx.builddir
+    
+    sh("sphinx-build -b html -j %s -d %s %s %s" % (jobs, 
+        builddir / 'doctrees', docroot, builddir / 'html'))
+    
+@task
+@needs('build_html')
 def prepare_docs():
     """Prepares the SunPy HTML documentation for packaging"""
-    sourcedir = 'doc/source/_build/html'
-    destdir = 'doc/html'
-    if os.path.exists(destdir):
-        shutil.rmtree(destdir)
-    shutil.move(sourcedir, destdir)
+    # Sphinx's build output is left in place so that the next build only
+    # needs to regenerate the pages that changed
+    _sync_tree('doc/source/_build/html', 'doc/html')
+    
+def _sync_tree(src, dst):
+    """Makes dst a copy of src, only writing files whose contents differ"""
+    for root, dirs, files in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for name in files:
+            srcfile = os.path.join(root, name)
+            dstfile = os.path.join(target, name)
+            if (not os.path.exists(dstfile) or 
+                not filecmp.cmp(srcfile, dstfile, shallow=False)):
+                shutil.copy2(srcfile, dstfile)
+    
+    # Remove whatever is no longer part of the source tree
+    for root, dirs, files in os.walk(dst, topdown=False):
+        origin = os.path.join(src, os.path.relpath(root, dst))
+        for name in files:
+            if not os.path.exists(os.path.join(origin, name)):
+                os.remove(os.path.join(root, name))
+        if not os.path.exists(origin):
+            os.rmdir(root)
     
 @task
-@needs('paver.doctools.html', 'upload_docs')
+@needs('build_html', 'upload_docs')
 @cmdopts([('username=', 'u', 'Username')])
 def deploy(options):
     """Update the docs on sunpy.org"""
@@ -101,9 +134,11 @@ def clean():
              glob('doc/source/reference/*/generated'))
 
     for dir_ in dirs:
-        if os.path.exists(dir_):
-            shutil.rmtree(dir_)
+        shutil.rmtree(dir_, ignore_errors=True)
 
     for file_ in glob('distribute-*') + ['MANIFEST']:
-        if os.path.exists(file_):
+        try:
             os.remove(file_)
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                raise
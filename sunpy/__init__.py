@@ -22,16 +22,60 @@ map
 """
 from __future__ import absolute_import
 
+import os
+import sys
+import types
+
 __version__ = 0.1
 
-import sunpy.map
-from sunpy.map import make_map
-from sunpy.map import Map
-from sunpy.map.header import MapHeader
-from sunpy.map.mapcube import MapCube
-from sunpy.map.compositemap import CompositeMap
-from sunpy.cm import *
-
-# Sample data
-from sunpy.data.sample import (AIA_171_IMAGE, RHESSI_IMAGE, EIT_195_IMAGE, 
-                               RHESSI_EVENT_LIST)
+# Objects exported by the sunpy package, mapped to the module that defines
+# them. They are imported on first access so that "import sunpy" does not
+# pull in numpy, matplotlib and pyfits for code that only needs, for example,
+# sunpy.net.
+_LAZY_ATTRS = {
+    'make_map': 'sunpy.map',
+    'Map': 'sunpy.map',
+    'MapHeader': 'sunpy.map.header',
+    'MapCube': 'sunpy.map.mapcube',
+    'CompositeMap': 'sunpy.map.compositemap',
+    '_cm': 'sunpy.cm',
+    
+    # Sample data
+    'AIA_171_IMAGE': 'sunpy.data.sample',
+    'RHESSI_IMAGE': 'sunpy.data.sample',
+    'EIT_195_IMAGE': 'sunpy.data.sample',
+    'RHESSI_EVENT_LIST': 'sunpy.data.sample'
+}
+
+class _LazyModule(types.ModuleType):
+    """Module type of the sunpy package which imports the objects listed in
+    _LAZY_ATTRS, as well as subpackages, the first time they are accessed."""
+    def __getattr__(self, name):
+        if name in _LAZY_ATTRS:
+            module = _LAZY_ATTRS[name]
+        elif not name.startswith('_') and any(
+            os.path.isdir(os.path.join(path, name)) for path in self.__path__):
+            module = "%s.%s" % (self.__name__, name)
+            name = None
+        else:
+            raise AttributeError(
+                "'module' object has no attribute '%s'" % name)
+        
+        __import__(module)
+        value = sys.modules[module]
+        if name is not None:
+            value = getattr(value, name)
+        
+        setattr(self, name or module.rsplit('.', 1)[-1], value)
+        return value
+
+__all__ = ['make_map', 'Map', 'MapHeader', 'MapCube', 'CompositeMap', 'cm',
+           'AIA_171_IMAGE', 'RHESSI_IMAGE', 'EIT_195_IMAGE', 
+           'RHESSI_EVENT_LIST']
+
+# Replace this module by a lazy one with the same contents. The original is
+# kept referenced, as its namespace is cleared when it is garbage collected.
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update(sys.modules[__name__].__dict__)
+_module._original = sys.modules[__name__]
+sys.modules[__name__] = _module
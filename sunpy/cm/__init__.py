@@ -1 +1,7 @@
+from __future__ import absolute_import
+
 __all__ = ['cm', '_cm']
+
+# sunpy.cm used to be the sunpy.cm.cm module itself, so keep its colormaps
+# and functions available from the package
+from sunpy.cm.cm import *
@@ -11,6 +11,11 @@ import matplotlib.cbook as cbook
 import matplotlib.cm as cm
 from sunpy.cm import _cm
 
+__all__ = ['sdoaia94', 'sdoaia131', 'sdoaia171', 'sdoaia193', 'sdoaia211',
+           'sdoaia304', 'sdoaia335', 'sdoaia1600', 'sdoaia1700', 'sdoaia4500',
+           'sohoeit171', 'sohoeit195', 'sohoeit284', 'sohoeit304',
+           'cmlist', 'get_cmap', 'show_colormaps']
+
 sdoaia94 = _cm.aia_color_table(94)
 sdoaia131 = _cm.aia_color_table(131)
 sdoaia171 = _cm.aia_color_table(171)
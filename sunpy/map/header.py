@@ -13,35 +13,60 @@ class MapHeader(dict):
     Parameters
     ----------
     header : pyfits.core.Header, dict
-        Header tags associated with the data
+        Header tags associated with the data. Use MapHeader.from_file to
+        read the header of a file.
         
     Attributes
     ----------
     
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, header, **kwargs):
         """Creates a new MapHeader instance"""
-        if isinstance(args[0], basestring):
-            # filepath
-            from sunpy.io import read_header
-            tags = read_header(args[0])
+        if isinstance(header, MapHeader):
+            # keys are already upper-case
+            dict.__init__(self, header)
+        elif isinstance(header, dict):
+            # Copying a dict wholesale is much faster than inserting its items
+            # one by one, and FITS keys are usually upper-case already, so
+            # only the remaining ones need to be renamed afterwards
+            dict.__init__(self, header)
+            
+            for k in [k for k in self if k != k.upper()]:
+                dict.__setitem__(self, k.upper(), dict.pop(self, k))
+        elif isinstance(header, basestring):
+            raise TypeError("MapHeader expects a header, not a path; "
+                            "use MapHeader.from_file to read one from a file")
         else:
-            # dictionary
-            tags = args[0]
-
-        # Store all keys as upper-case to allow for case-insensitive indexing
-        tags = dict((k.upper(), v) for k, v in tags.items())
-        args = (tags,) + args[1:]
-
-        dict.__init__(self, *args, **kwargs)            
+            dict.__init__(self)
             
+            # Store all keys as upper-case to allow for case-insensitive 
+            # indexing
+            for k, v in header.items():
+                dict.__setitem__(self, k.upper(), v)
+        for k, v in kwargs.items():
+            dict.__setitem__(self, k.upper(), v)
+            
+    @classmethod
+    def from_file(cls, filepath):
+        """Creates a new MapHeader from the header of a file"""
+        from sunpy.io import read_header
+        return cls(read_header(filepath))
+    
+    # Keys are always stored upper-case, so the lookups below first try the
+    # key as given and only normalize it if that fails. FITS keywords are
+    # plain ASCII, for which str.upper is already cheaper than a translate
+    # table, and it also handles unicode keys.
     def __contains__(self, key):
         """Overide __contains__"""
-        return dict.__contains__(self, key.upper())
+        return (dict.__contains__(self, key) or 
+                dict.__contains__(self, key.upper()))
             
     def __getitem__(self, key):
         """Overide [] indexing"""
-        return dict.__getitem__(self, key.upper())
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            return dict.__getitem__(self, key.upper())
     
     def __setitem__(self, key, value):
         """Overide [] indexing"""
@@ -49,25 +74,35 @@ class MapHeader(dict):
     
     def copy(self):
         """Overide copy operator"""
-        return type(self)(dict.copy(self))
+        return type(self)(self)
     
     def get(self, key, default=None):
         """Overide .get() indexing"""
-        return dict.get(self, key.upper(), default)
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            return dict.get(self, key.upper(), default)
     
     def has_key(self, key):
         """Overide .has_key() to perform case-insensitively"""
-        return dict.has_key(self, key.upper())
+        return self.__contains__(key)
     
     def pop(self, key, default=None):
         """Overide .pop() to perform case-insensitively"""
-        return dict.pop(self, key.upper(), default)
+        try:
+            return dict.pop(self, key)
+        except KeyError:
+            return dict.pop(self, key.upper(), default)
     
     def update(self, dict2):
         """Overide .update() to perform case-insensitively"""
-        return dict.update(self, dict((k.upper(),v) for k,v in dict2.items()))
+        for k, v in dict2.items():
+            dict.__setitem__(self, k.upper(), v)
 
     def setdefault(self, key, default=None):
         """Overide .setdefault() to perform case-insensitively"""
-        return dict.setdefault(self, key.upper(), default)
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            return dict.setdefault(self, key.upper(), default)
         
\ No newline at end of file
@@ -5,6 +5,7 @@ from __future__ import absolute_import
 
 import os
 import urllib2
+import urlparse
 import select
 import socket
 import threading
@@ -285,7 +286,9 @@ class Downloader(object):
         self.q = defaultdict(deque)
         
         self.reactor = DummyReactor()
-        self.buf = 9096
+        # Every read runs on the reactor thread and holds up all other
+        # downloads, so read in large chunks to need few of them.
+        self.buf = 65536
     
     def _download(self, sock, fd, callback, id_=None):
         rec = sock.read(self.buf)
@@ -301,7 +304,7 @@ class Downloader(object):
             fd.write(rec)
     
     def _start_download(self, url, path, callback, errback):
-        server = url.split('/')[0]
+        server = urlparse.urlsplit(url).netloc
         
         self.connections[server] += 1
         self.conns += 1
@@ -333,7 +336,7 @@ class Downloader(object):
             self.reactor.add_fd(sock, partial(self._download, *args))
     
     def _attempt_download(self, url, path, callback, errback):
-        server = url.split('/')[0]
+        server = urlparse.urlsplit(url).netloc
         
         if self.connections[server] < self.max_conn and self.conns < self.max_total:
             self._start_download(url, path, callback, errback)
@@ -341,7 +344,7 @@ class Downloader(object):
         return False
 
     def download(self, url, path, callback, errback):
-        server = url.split('/')[0]
+        server = urlparse.urlsplit(url).netloc
         
         if not self._attempt_download(url, path, callback, errback):
             self.q[server].append((url, path, callback, errback))
@@ -349,12 +352,13 @@ class Downloader(object):
     def _close(self, callback, args, server):
         callback(*args)
         
+        # _start_download counts the connection again.
+        self.connections[server] -= 1
+        self.conns -= 1
+        
         if self.q[server]:
             self._start_download(*self.q[server].pop())
         else:
-            self.connections[server] -= 1
-            self.conns -= 1
-            
             for k, v in self.q.iteritems():
                 while v:
                     if self._attempt_download(*v[0]):
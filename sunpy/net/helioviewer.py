@@ -34,27 +34,182 @@ __email__ = "keith.hughitt@nasa.gov"
 
 import os
 import json
+import datetime
+import email.message
+import email.utils
+import time
+import hashlib
+import tempfile
+import Queue
+import shutil
+import socket
 import urllib
 import urllib2
+import httplib
+import urlparse
+import threading
 from sunpy.util import util
 
 # Helioviewer API URL
 __BASE_API_URL__ = "http://helioviewer.org/api/"
 
-def get_data_sources(**kwargs):
-    """Returns a structured list of datasources available at Helioviewer.org"""
+class _ConnectionPool(object):
+    """Keeps persistent HTTP connections to a single host so that successive
+    API requests can reuse them instead of opening a new TCP connection each
+    time.
+    
+    Connections are handed out to one caller at a time, which makes the pool
+    safe to share between threads.
+    
+    Requests that need a proxy (as configured in the environment, e.g. by
+    http_proxy and no_proxy) and requests answered by a redirect are left to
+    urllib2.urlopen, which handles both.
+    """
+    def __init__(self, url, maxsize=16, timeout=30):
+        parts = urlparse.urlsplit(url)
+        
+        self.url = url
+        self.scheme = parts.scheme
+        self.hostname = parts.hostname
+        self.host = parts.netloc
+        self.path = parts.path or "/"
+        self.headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        self.timeout = timeout
+        self._idle = Queue.LifoQueue(maxsize)
+        
+    def _get(self):
+        try:
+            return self._idle.get_nowait()
+        except Queue.Empty:
+            return httplib.HTTPConnection(self.host, timeout=self.timeout)
+        
+    def _use_proxy(self):
+        """Returns whether requests have to go through a proxy"""
+        return (self.scheme in urllib.getproxies() and
+                not urllib.proxy_bypass(self.hostname))
+        
+    def _urlopen(self, body):
+        """Sends a request with urllib2 and returns the response"""
+        response = urllib2.urlopen(self.url, body, self.timeout)
+        # Give it the interface of the pooled responses
+        response.getheader = response.info().getheader
+        return response
+        
+    def release(self, conn):
+        """Returns a connection to the pool once its response has been
+        read completely."""
+        if conn is None:
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except Queue.Full:
+            conn.close()
+            
+    def close(self, conn):
+        """Closes a connection that cannot be reused"""
+        if conn is not None:
+            conn.close()
+            
+    def request(self, params):
+        """Sends params to the API and returns a (connection, response) tuple.
+        
+        The caller must read the response to the end and then hand the
+        connection back using release. Responses obtained from urllib2 come
+        with None as their connection.
+        """
+        body = _encode(params)
+        
+        if self._use_proxy():
+            return None, self._urlopen(body)
+        
+        # An idle connection may have been dropped by the server in the
+        # meantime; in that case retry once on a fresh connection.
+        for attempt in (0, 1):
+            conn = self._get()
+            try:
+                conn.request("POST", self.path, body, self.headers)
+                response = conn.getresponse()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if attempt:
+                    raise
+            else:
+                break
+            
+        if response.status >= 400:
+            conn.close()
+            raise urllib2.HTTPError(self.url, response.status, response.reason,
+                                    response.msg, response)
+        if response.status >= 300:
+            # Let urllib2 follow the redirect
+            conn.close()
+            return None, self._urlopen(body)
+        return conn, response
+    
+_POOL = _ConnectionPool(__BASE_API_URL__)
+
+# Encoded "action=..." query string fragments, which are the same for every
+# request to a given API method
+_ENCODED_ACTIONS = {}
+
+def _encode(params):
+    """URL-encodes request parameters, reusing the encoded action"""
+    if "action" not in params:
+        return urllib.urlencode(params, True)
+    
+    action = params["action"]
+    try:
+        encoded = _ENCODED_ACTIONS[action]
+    except KeyError:
+        encoded = _ENCODED_ACTIONS[action] = urllib.urlencode(
+            {"action": action})
+        
+    others = [(k, v) for k, v in params.iteritems() if k != "action"]
+    if others:
+        return encoded + "&" + urllib.urlencode(others, True)
+    return encoded
+
+# Dates already converted by _parse_date
+_DATE_CACHE = {}
+_DATE_CACHE_SIZE = 1024
+
+# Per-user directory in which API responses are cached, for at most
+# _CACHE_TTL seconds. Every _PRUNE_INTERVAL writes, all but the _CACHE_SIZE
+# most recent files are removed.
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".sunpy", "helioviewer")
+_CACHE_TTL = 24 * 60 * 60
+_CACHE_SIZE = 256
+_PRUNE_INTERVAL = 32
+
+# Number of responses written to the cache so far
+_cache_writes = 0
+
+# New images for a date can arrive for a while after it, so the closest
+# image to a date more recent than this is never cached
+_RECENT = datetime.timedelta(days=2)
+
+def get_data_sources(force_refresh=False, **kwargs):
+    """Returns a structured list of datasources available at Helioviewer.org
+    
+    The list rarely changes, so responses are cached on disk for a day. Set
+    force_refresh to True to bypass the cache."""
     params = {"action": "getDataSources"}
     params.update(kwargs)
     
-    return json.loads(_request(params))    
+    return _cached_request("datasources", params, force_refresh)
 
-def get_closest_image(date, observatory, instrument, detector, measurement):
+def get_closest_image(date, observatory, instrument, detector, measurement,
+                      force_refresh=False):
     """Finds the closest image available for the specified source and date.
     
     For more information on what types of requests are available and the
     expected usage for the response, consult the Helioviewer API documenation:
         http://helioviewer.org/api
     
+    Responses are cached on disk for a day, keyed on the date and the source,
+    unless the date is within two days of now. Set force_refresh to True to
+    bypass the cache.
+    
     Parameters
     ----------
     date : mixed
@@ -66,6 +221,9 @@ def get_closest_image(date, observatory, instrument, detector, measurement):
     detector : string
         The detector to match
     measurement : string
+        The measurement to match
+    force_refresh : bool
+        Whether to skip the on-disk cache
         
     Returns
     -------
@@ -84,14 +242,18 @@ def get_closest_image(date, observatory, instrument, detector, measurement):
     >>> 
     """
     # TODO 06/26/2011 Input validation
+    date, formatted = _parse_date(date)
     params = {
-        "date": util.anytim(date),
+        "action": "getClosestImage",
+        "date": formatted,
         "observatory": observatory,
         "instrument": instrument,
         "detector": detector,
         "measurement": measurement
     }
-    return _request(params)
+    if date > datetime.datetime.utcnow() - _RECENT:
+        return json.loads(_request(params))
+    return _cached_request("closestimage", params, force_refresh)
 
 def get_jp2_image(date, directory=None, **kwargs):
     """
@@ -110,30 +272,201 @@ def get_jp2_image(date, directory=None, **kwargs):
     """
     params = {
         "action": "getJP2Image",
-        "date": util.anytim(date).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z"
+        "date": _format_date(date)
     }
     params.update(kwargs)
     
     # Submit request
-    response = urllib2.urlopen(__BASE_API_URL__, urllib.urlencode(params))
+    conn, response = _POOL.request(params)
     
     # JPIP URL response
     if 'jpip' in kwargs:
-        return response.read()
+        result = response.read()
+        _POOL.release(conn)
+        return result
     
     # JPEG 2000 image response
     if directory is None:
-        import tempfile
         directory = tempfile.gettempdir()
     
-    filename = response.info()['Content-Disposition'][22:-1]
+    filename = _get_filename(response.getheader('Content-Disposition'))
     filepath = os.path.join(directory, filename)
     
-    f = open(filepath, 'wb')
-    f.write(response.read())
+    # Stream the image to disk in chunks rather than reading it into memory
+    try:
+        with open(filepath, 'wb') as f:
+            shutil.copyfileobj(response, f, 1 << 16)
+    except:
+        _POOL.close(conn)
+        raise
+    _POOL.release(conn)
     
     return filepath
 
+def get_jp2_images(dates, directory=None, max_workers=8, **kwargs):
+    """
+    Downloads the JPEG 2000 images that most closely match each of the
+    specified times. The downloads run concurrently and share the pool of
+    connections to the Helioviewer API.
+    
+    Parameters
+    ----------
+    dates : list
+        Strings or datetime objects for the desired dates of the images
+    directory : string
+        Directory to save the images to
+    max_workers : int
+        Maximum number of simultaneous downloads
+    kwargs : 
+        Additional parameters passed on to get_jp2_image for every date
+        
+    Returns
+    -------
+    list : The filepaths (or JPIP URLs) of the images, in the order of dates.
+    """
+    dates = list(dates)
+    results = [None] * len(dates)
+    errors = []
+    
+    tasks = Queue.Queue()
+    for item in enumerate(dates):
+        tasks.put(item)
+    
+    def worker():
+        while True:
+            try:
+                i, date = tasks.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[i] = get_jp2_image(date, directory, **kwargs)
+            except Exception, e: #pylint: disable=W0703
+                errors.append(e)
+    
+    threads = [threading.Thread(target=worker) 
+               for _ in xrange(min(max_workers, len(dates)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+        
+    if errors:
+        raise errors[0]
+    
+    return results
+
+def _format_date(date):
+    """Returns a date in the ISO 8601 format expected by the API"""
+    return _parse_date(date)[1]
+
+def _parse_date(date):
+    """Returns a (datetime, string) tuple of a date and its ISO 8601 format
+    expected by the API
+    
+    Results for date strings and datetimes are cached, so that the same date
+    is only parsed once when it is requested repeatedly."""
+    try:
+        return _DATE_CACHE[date]
+    except (KeyError, TypeError):
+        pass
+    
+    parsed = util.anytim(date)
+    result = (parsed,
+              parsed.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + "Z")
+    
+    if isinstance(date, (basestring, datetime.datetime)):
+        if len(_DATE_CACHE) >= _DATE_CACHE_SIZE:
+            _DATE_CACHE.clear()
+        _DATE_CACHE[date] = result
+        
+    return result
+
+def _get_filename(disposition):
+    """Returns the filename given in a Content-Disposition header"""
+    msg = email.message.Message()
+    msg['Content-Disposition'] = disposition
+    
+    filename = msg.get_param('filename', header='Content-Disposition')
+    return email.utils.collapse_rfc2231_value(filename)
+
+def _cache_path(name, params):
+    """Returns the path of the on-disk cache file for a request"""
+    key = hashlib.md5(urllib.urlencode(sorted(params.items()))).hexdigest()
+    return os.path.join(_CACHE_DIR, "%s_%s.json" % (name, key))
+
+def _count_cache_write():
+    """Counts a response written to the cache, pruning it on the first
+    write and every _PRUNE_INTERVAL writes after that"""
+    global _cache_writes #pylint: disable=W0603
+    
+    if _cache_writes % _PRUNE_INTERVAL == 0:
+        _prune_cache()
+    _cache_writes += 1
+
+def _prune_cache():
+    """Removes cached responses older than _CACHE_TTL and, of the others,
+    all but the _CACHE_SIZE most recent ones"""
+    now = time.time()
+    files = []
+    for name in os.listdir(_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(_CACHE_DIR, name)
+        try:
+            mtime = os.path.getmtime(path)
+            if now - mtime >= _CACHE_TTL:
+                os.remove(path)
+            else:
+                files.append((mtime, path))
+        except OSError:
+            pass
+    
+    files.sort()
+    for _, path in files[:max(0, len(files) - _CACHE_SIZE)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _cached_request(name, params, force_refresh=False):
+    """Sends an API request and returns the decoded JSON result, reusing a
+    response cached on disk if it is less than _CACHE_TTL seconds old
+    
+    Parameters
+    ----------
+    name : string
+        Name of the cache the response belongs to
+    params : dict
+        Parameters to send
+    force_refresh : bool
+        Whether to ignore the cached response
+    """
+    cache = _cache_path(name, params)
+    
+    if not force_refresh:
+        try:
+            if time.time() - os.path.getmtime(cache) < _CACHE_TTL:
+                with open(cache) as f:
+                    return json.load(f)
+        except (OSError, IOError, ValueError):
+            pass
+    
+    response = _request(params)
+    result = json.loads(response)
+    
+    # The cache directory is private, so that other users cannot plant
+    # responses in it
+    try:
+        if not os.path.isdir(_CACHE_DIR):
+            os.makedirs(_CACHE_DIR, 0700)
+        with open(cache, 'w') as f:
+            f.write(response)
+        _count_cache_write()
+    except (OSError, IOError):
+        pass
+    
+    return result
+
 def _request(params):
     """Sends an API request and returns the result
     
@@ -146,31 +479,23 @@ def _request(params):
     -------
     out : String containing the result of the request
     """
-    response = urllib2.urlopen(__BASE_API_URL__, urllib.urlencode(params))
-        
-    return response.read()
+    conn, response = _POOL.request(params)
+    result = response.read()
+    _POOL.release(conn)
+    
+    return result
 
 # Keith 2011/06/26: this will eventually be moved to the utilities module
 # http://code.activestate.com/recipes/410469-xml-as-dictionary/
 try:
-    import cElementTree as ElementTree #pylint: disable=W0611
+    from xml.etree import cElementTree as ElementTree #pylint: disable=W0611
 except ImportError:
-    import xml.etree.ElementTree as ElementTree #pylint: disable=W0404
+    from xml.etree import ElementTree #pylint: disable=W0404
 
 class XmlListConfig(list):
-    def __init__(self, aList):
-        for element in aList:
-            if element:
-                # treat like dict
-                if len(element) == 1 or element[0].tag != element[1].tag:
-                    self.append(XmlDictConfig(element))
-                # treat like list
-                elif element[0].tag == element[1].tag:
-                    self.append(XmlListConfig(element))
-            elif element.text:
-                text = element.text.strip()
-                if text:
-                    self.append(text)
+    def __init__(self, aList=None):
+        if aList is not None:
+            _xml_fill(self, aList)
 
 
 class XmlDictConfig(dict):
@@ -188,33 +513,74 @@ class XmlDictConfig(dict):
 
     And then use xmldict for what it is... a dict.
     '''
-    def __init__(self, parent_element):
-        if parent_element.items():
-            self.update(dict(parent_element.items()))
-        for element in parent_element:
-            if element:
-                # treat like dict - we assume that if the first two tags
-                # in a series are different, then they are all different.
-                if len(element) == 1 or element[0].tag != element[1].tag:
-                    aDict = XmlDictConfig(element)
-                # treat like list - we assume that if the first two tags
-                # in a series are the same, then the rest are the same.
-                else:
+    def __init__(self, parent_element=None):
+        if parent_element is not None:
+            _xml_fill(self, parent_element)
+
+
+def _xml_is_list(element):
+    """Whether the children of an element should be treated like a list - we
+    assume that if the first two tags in a series are the same, then the rest
+    are the same."""
+    return len(element) > 1 and element[0].tag == element[1].tag
+
+def _xml_fill(container, element):
+    """Fills an XmlDictConfig or XmlListConfig with the children of element.
+    
+    The tree is walked using an explicit stack rather than by recursing into
+    the constructors, which keeps deeply nested documents cheap to convert.
+    Each stack entry also records whether the attributes of the element
+    should be applied after its children, so that they take precedence like
+    they do for nested dicts.
+    """
+    stack = [(container, element, False)]
+    
+    while stack:
+        container, element, attrs_last = stack.pop()
+        
+        if isinstance(container, list):
+            for child in element:
+                if len(child):
+                    if _xml_is_list(child):
+                        value = XmlListConfig()
+                    else:
+                        value = XmlDictConfig()
+                    stack.append((value, child, False))
+                    container.append(value)
+                elif child.text:
+                    text = child.text.strip()
+                    if text:
+                        container.append(text)
+            continue
+        
+        attrs = element.items()
+        if attrs and not attrs_last:
+            container.update(attrs)
+            
+        for child in element:
+            if len(child):
+                if _xml_is_list(child):
                     # here, we put the list in dictionary; the key is the
                     # tag name the list elements all share in common, and
                     # the value is the list itself 
-                    aDict = {element[0].tag: XmlListConfig(element)}
-                # if the tag has attributes, add those to the dict
-                if element.items():
-                    aDict.update(dict(element.items()))
-                self.update({element.tag: aDict})
+                    items = XmlListConfig()
+                    stack.append((items, child, False))
+                    value = {child[0].tag: items}
+                    value.update(child.items())
+                else:
+                    value = XmlDictConfig()
+                    stack.append((value, child, True))
             # this assumes that if you've got an attribute in a tag,
             # you won't be having any text. This may or may not be a 
             # good idea -- time will tell. It works for the way we are
             # currently doing XML configuration files...
-            elif element.items():
-                self.update({element.tag: dict(element.items())})
+            elif child.items():
+                value = dict(child.items())
             # finally, if there are no child tags and no attributes, extract
             # the text
             else:
-                self.update({element.tag: element.text})
+                value = child.text
+            container[child.tag] = value
+            
+        if attrs and attrs_last:
+            container.update(attrs)
@@ -11,15 +11,21 @@ This module provides a wrapper around the VSO API.
 
 import re
 import os
+import errno
 import sys
+import Queue
+import time
 import tempfile
 import threading
 
 from datetime import datetime, timedelta
+from operator import attrgetter
+from itertools import groupby
 from functools import partial
 from collections import defaultdict
 
 from suds import client, TypeNotFound
+from suds.sudsobject import Object
 
 from sunpy.net import download
 from sunpy.net.attr import and_, Attr
@@ -28,7 +34,32 @@ from sunpy.util.util import anytim, to_angstrom, print_table
 
 DEFAULT_URL = 'http://docs.virtualsolar.org/WSDL/VSOi_rpc_literal.wsdl'
 DEFAULT_PORT = 'nsoVSOi'
-RANGE = re.compile(r'(\d+)(\s*-\s*(\d+))?(\s*([a-zA-Z]+))?')
+RANGE = re.compile(
+    r'(?P<min>\d+)(\s*-\s*(?P<max>\d+))?(\s*(?P<unit>[a-zA-Z]+))?'
+)
+
+# Parsed suds clients by (url, port).
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_client(url=DEFAULT_URL, port=DEFAULT_PORT):
+    """ Return a suds client for the WSDL at url, using the given port.
+    
+    The WSDL is only fetched and parsed the first time; after that, clones
+    of the cached client are returned, as suds clients keep per-call state.
+    """
+    key = (url, port)
+    _CLIENTS_LOCK.acquire()
+    try:
+        try:
+            api = _CLIENTS[key]
+        except KeyError:
+            api = _CLIENTS[key] = client.Client(url)
+            api.set_options(port=port)
+    finally:
+        _CLIENTS_LOCK.release()
+    return api.clone()
 
 
 # TODO: Name
@@ -85,8 +116,27 @@ class Results(object):
         self.poke()
 
 
+def _copy_object(obj):
+    """ Copy a suds object. Unlike copy.deepcopy, this does not copy the
+    schema objects referenced by the metadata. """
+    if isinstance(obj, list):
+        return [_copy_object(item) for item in obj]
+    if not isinstance(obj, Object):
+        return obj
+    
+    new = obj.__class__()
+    for k, v in obj.__metadata__:
+        setattr(new.__metadata__, k, v)
+    for k, v in obj:
+        setattr(new, k, _copy_object(v))
+    return new
+
+
 def _parse_waverange(string):
-    min_, max_, unit = RANGE.match(string)[::2]
+    match = RANGE.match(string)
+    if match is None:
+        raise ValueError("Invalid wave range: %r" % string)
+    min_, max_, unit = match.group('min', 'max', 'unit')
     return {
         'wave_wavemin': min_,
         'wave_wavemax': min_ if max_ is None else max_,
@@ -99,18 +149,79 @@ def _parse_date(string):
     return {'time_start': start.strip(), 'time_end': end.strip()}
 
 
+def _sdk(key):
+    return lambda value: {key: value}
+
+
+# Keyword arguments of query_legacy that are given in a different form
+# in the QueryRequest.
+_ALIASES = {
+    'wave_min': _sdk('wave_wavemin'),
+    'wave_max': _sdk('wave_wavemax'),
+    'wave_type': _sdk('wave_wavetype'),
+    'wave_unit': _sdk('wave_waveunit'),
+    'min_wave': _sdk('wave_wavemin'),
+    'max_wave': _sdk('wave_wavemax'),
+    'type_wave': _sdk('wave_wavetype'),
+    'unit_wave': _sdk('wave_waveunit'),
+    'wave': _parse_waverange,
+    'inst': _sdk('instrument'),
+    'telescope': _sdk('instrument'),
+    'spacecraft': _sdk('source'),
+    'observatory': _sdk('source'),
+    'start_date': _sdk('time_start'),
+    'end_date': _sdk('time_end'),
+    'start': _sdk('time_start'),
+    'end': _sdk('time_end'),
+    'near_time': _sdk('time_near'),
+    'date': _parse_date,
+    'layout': _sdk('datatype'),
+}
+
+# Keys of the query_legacy dicts split into the path of attributes
+# leading to the item to set and its name.
+_LEGACY_PATHS = {}
+
+
 def iter_records(response):
     for prov_item in response.provideritem:
-        if not hasattr(prov_item, 'record') or not prov_item.record:
+        # Missing attributes are looked up through the schema by suds,
+        # so try once rather than checking with hasattr first.
+        try:
+            record = prov_item.record
+        except AttributeError:
+            continue
+        if not record:
             continue
-        for record_item in prov_item.record.recorditem:
+        for record_item in record.recorditem:
             yield record_item
 
 
 def iter_errors(response):
     for prov_item in response.provideritem:
-        if not hasattr(prov_item, 'record') or not prov_item.record:
+        try:
+            record = prov_item.record
+        except AttributeError:
             yield prov_item
+            continue
+        if not record:
+            yield prov_item
+
+
+# Keyword arguments of VSOClient.make split into the path of attributes
+# leading to the item to set and its name.
+_PATHS = {}
+
+
+def _format_time(string):
+    """ Turn a VSO time string into the format str(datetime) would give
+    without parsing it. """
+    if len(string) != 14 or not string.isdigit():
+        return str(datetime.strptime(string, TIMEFORMAT))
+    return '%s-%s-%s %s:%s:%s' % (
+        string[:4], string[4:6], string[6:8],
+        string[8:10], string[10:12], string[12:]
+    )
 
 
 class QueryResponse(list):
@@ -120,14 +231,25 @@ class QueryResponse(list):
         self.errors = []
     
     @classmethod
-    def create(cls, queryresult):
-        return cls(iter_records(queryresult), queryresult)
+    def create(cls, queryresult, keep_raw=False):
+        """ Create QueryResponse from the records in the suds response
+        queryresult. Unless keep_raw is True, the response itself is not
+        kept around, so the parts of it that are not records can be
+        freed. """
+        return cls(
+            iter_records(queryresult), queryresult if keep_raw else None
+        )
     
     def total_size(self):
         """ Total size of data in KB. May be less than the actual
         size because of inaccurate data providers. """
         # Warn about -1 values?
-        return sum(record.size for record in self if record.size > 0)
+        total = 0
+        for record in self:
+            size = record.size
+            if size > 0:
+                total += size
+        return total
     
     def num_records(self):
         """ Return number of records. """
@@ -135,23 +257,33 @@ class QueryResponse(list):
     
     def time_range(self):
         """ Return total time-range all records span across. """
-        return (
-            datetime.strptime(
-                min(record.time.start for record in self), TIMEFORMAT),
-            datetime.strptime(
-                max(record.time.end for record in self), TIMEFORMAT)
-        )
+        start = end = None
+        # Find both ends in one pass, as every attribute access on a
+        # record goes through suds.
+        for record in self:
+            time = record.time
+            if start is None or time.start < start:
+                start = time.start
+            if end is None or time.end > end:
+                end = time.end
+        if start is None:
+            raise ValueError("time_range of empty QueryResponse")
+        
+        strptime = datetime.strptime
+        return strptime(start, TIMEFORMAT), strptime(end, TIMEFORMAT)
 
     def show(self):
         """Print out human-readable summary of records retreived"""
 
-        table = [[str(datetime.strptime(record.time.start, TIMEFORMAT)), 
-          str(datetime.strptime(record.time.end, TIMEFORMAT)), 
-          record.source,
-          record.instrument,
-          record.extent.type] for record in self]
-        table.insert(0, ['----------','--------','------','----------','----'])        
-        table.insert(0, ['Start time','End time','Source','Instrument','Type'])
+        table = [
+            ('Start time', 'End time', 'Source', 'Instrument', 'Type'),
+            ('----------', '--------', '------', '----------', '----')
+        ]
+        table.extend(
+            (_format_time(record.time.start), _format_time(record.time.end),
+             record.source, record.instrument, record.extent.type)
+            for record in self
+        )
 
         print(print_table(table, colsep = '  ', linesep='\n'))
             
@@ -181,18 +313,31 @@ class VSOClient(object):
     method_order = [
         'URL-TAR_GZ', 'URL-ZIP', 'URL-TAR', 'URL-FILE', 'URL-packaged'
     ]
-    def __init__(self, api=None):
+    # Maximum number of Query requests sent at the same time.
+    max_query_concurrency = 8
+    
+    def __init__(self, api=None, url=DEFAULT_URL, port=DEFAULT_PORT):
+        """ Use the suds client api, or, if it is None, one for the WSDL
+        at url using the given port. """
         if api is None:
-            api = client.Client(DEFAULT_URL)
-            api.set_options(port=DEFAULT_PORT)
+            api = _get_client(url, port)
         self.api = api
+        self._prototypes = {}
     
     def make(self, type_, **kwargs):
-        obj = self.api.factory.create(type_)
+        # Building an object from the WSDL is expensive, so every type is
+        # only created once and copied after that.
+        try:
+            prototype = self._prototypes[type_]
+        except KeyError:
+            prototype = self._prototypes[type_] = self.api.factory.create(type_)
+        obj = _copy_object(prototype)
         for k, v in kwargs.iteritems():
-            split = k.split('__')
-            tip = split[-1]
-            rest = split[:-1]
+            try:
+                rest, tip = _PATHS[k]
+            except KeyError:
+                split = k.split('__')
+                rest, tip = _PATHS[k] = tuple(split[:-1]), split[-1]
             
             item = obj
             for elem in rest:
@@ -200,18 +345,27 @@ class VSOClient(object):
             
             if isinstance(v, dict):
                 # Do not throw away type information for dicts.
-                for k, v in v.iteritems():
-                    item[tip][k] = v
+                target = item[tip]
+                if isinstance(target, dict):
+                    target.update(v)
+                else:
+                    for k, v in v.iteritems():
+                        target[k] = v
             else:
                 item[tip] = v
         return obj
     
-    def query(self, *query):
+    def query(self, *query, **kwargs):
         """ Query data from the VSO with the new API. Takes a variable number
         of attributes as parameter, which are chained together using AND.
         
         The new query language allows complex queries to be easily formed.
         
+        Queries that combine attributes using OR result in multiple query
+        blocks, which are sent as separate requests. If the server supports
+        multiple blocks per request, pass batch=True to send all of them in
+        a single round trip.
+        
         Examples
         --------
         Query all data from eit or aia between 2010-01-01T00:00 and
@@ -226,57 +380,106 @@ class VSOClient(object):
         -------
         out : :py:class:`QueryResult` (enhanced list) of matched items. Return value of same type as the one of :py:meth:`VSOClient.query`.
         """
+        batch = kwargs.pop('batch', False)
+        if kwargs:
+            raise TypeError("Unexpected keyword argument %s." % kwargs.keys()[0])
+        
         query = and_(*query)
+        blocks = walker.create(query, self.api)
         
-        responses = []
-        for block in walker.create(query, self.api):
-            try:
-                responses.append(
-                    self.api.service.Query(
-                        self.make('QueryRequest', block=block)
-                    )
-                )
-            except TypeNotFound:
-                pass
-            except Exception as ex:
-                response = QueryResponse.create(self.merge(responses))
-                response.add_error(ex)
+        if batch:
+            requests = [self.make('QueryRequest', block=blocks)]
+        else:
+            requests = [
+                self.make('QueryRequest', block=block) for block in blocks
+            ]
+        responses, errors = self.query_blocks(requests)
+        
+        response = QueryResponse.create(self.merge(responses))
+        for ex in errors:
+            response.add_error(ex)
+        return response
+    
+    def query_blocks(self, requests):
+        """ Send the QueryRequests, running up to max_query_concurrency of
+        them at the same time. Return the responses in the order of the
+        requests and the exceptions that were raised, including the
+        TypeNotFound of blocks whose response could not be parsed. """
+        responses = [None] * len(requests)
+        errors = []
+        
+        tasks = Queue.Queue()
+        for item in enumerate(requests):
+            tasks.put(item)
+        
+        def worker(api):
+            while True:
+                try:
+                    n, request = tasks.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    responses[n] = api.service.Query(request)
+                except Exception as ex:
+                    errors.append(ex)
+        
+        nthreads = min(self.max_query_concurrency, len(requests))
+        if nthreads <= 1:
+            worker(self.api)
+        else:
+            # suds clients keep per-call state, so every thread gets a clone
+            # that only shares the parsed WSDL.
+            threads = [
+                threading.Thread(target=worker, args=(self.api.clone(), ))
+                for _ in xrange(nthreads)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
         
-        return QueryResponse.create(self.merge(responses))
+        return [resp for resp in responses if resp is not None], errors
     
     def merge(self, queryresponses):
         if len(queryresponses) == 1:
             return queryresponses[0]
         
-        fileids = set()
         providers = {}
+        # Fileids are only unique within a provider.
+        fileids = {}
+        # Records to add to the first provideritem of every provider.
+        additional = defaultdict(list)
         
         for queryresponse in queryresponses:
             for provideritem in queryresponse.provideritem:
                 provider = provideritem.provider
-                if not hasattr(provideritem, 'record'):
-                    continue
-                if not hasattr(provideritem.record, 'recorditem'):
+                try:
+                    recorditem = provideritem.record.recorditem
+                except AttributeError:
                     continue
-                if not provideritem.provider in providers:
+                if not provider in providers:
                     providers[provider] = provideritem
-                    fileids |= set(
-                        record_item.fileid
-                        for record_item in provideritem.record.recorditem
+                    fileids[provider] = set(
+                        record_item.fileid for record_item in recorditem
                     )
                 else:
-                    for record_item in provideritem.record.recorditem:
-                        if record_item.fileid not in fileids:
-                            fileids.add(record_item.fileid)
-                            providers[provider].record.recorditem.append(
-                                record_item
-                            )
-                            providers[provider].no_of_records_found += 1
-                            providers[provider].no_of_records_returned += 1
+                    seen = fileids[provider]
+                    new = additional[provider]
+                    for record_item in recorditem:
+                        if record_item.fileid not in seen:
+                            seen.add(record_item.fileid)
+                            new.append(record_item)
+        
+        for provider, new in additional.iteritems():
+            if new:
+                provideritem = providers[provider]
+                provideritem.record.recorditem.extend(new)
+                provideritem.no_of_records_found += len(new)
+                provideritem.no_of_records_returned += len(new)
         return self.make('QueryResponse', provideritem=providers.values())
     
     @staticmethod
-    def mk_filename(pattern, response, sock, url):
+    def mk_filename(pattern, response, sock, url, directories=None):
         # FIXME: os.path.exists(name)
         name = sock.headers.get(
             'Content-Disposition', url.rstrip('/').rsplit('/', 1)[-1]
@@ -286,8 +489,17 @@ class VSOClient(object):
         
         fname = pattern.format(file=name, **dict(response))
         dir_ = os.path.dirname(fname)
-        if not os.path.exists(dir_):
-            os.makedirs(dir_)
+        # Many files usually go to the same directory, so only make sure
+        # it exists the first time. directories holds the ones already
+        # created, for the files of one call to get.
+        if directories is None or dir_ not in directories:
+            try:
+                os.makedirs(dir_)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+            if directories is not None:
+                directories.add(dir_)
         return fname
     
     # pylint: disable=R0914
@@ -367,39 +579,22 @@ class VSOClient(object):
         -------
         out : :py:class:`QueryResult` (enhanced list) of matched items. Return value of same type as the one of :py:class:`VSOClient.query`.
         """
-        sdk = lambda key: lambda value: {key: value}
-        ALIASES = {
-            'wave_min': sdk('wave_wavemin'),
-            'wave_max': sdk('wave_wavemax'),
-            'wave_type': sdk('wave_wavetype'),
-            'wave_unit': sdk('wave_waveunit'),
-            'min_wave': sdk('wave_wavemin'),
-            'max_wave': sdk('wave_wavemax'),
-            'type_wave': sdk('wave_wavetype'),
-            'unit_wave': sdk('wave_waveunit'),
-            'wave': _parse_waverange,
-            'inst': sdk('instrument'),
-            'telescope': sdk('instrument'),
-            'spacecraft': sdk('source'),
-            'observatory': sdk('source'),
-            'start_date': sdk('time_start'),
-            'end_date': sdk('time_end'),
-            'start': sdk('time_start'),
-            'end': sdk('time_end'),
-            'near_time': sdk('time_near'),
-            'date': _parse_date,
-            'layout': sdk('datatype'),
-        }
         kwargs.update({'time_start': tstart, 'time_end': tend})
         
-        queryreq = self.api.factory.create('QueryRequest')
+        queryreq = self.make('QueryRequest')
         for key, value in kwargs.iteritems():
             if key.startswith('time'):
                 value = anytim(value).strftime(TIMEFORMAT)
-            for k, v in ALIASES.get(key, sdk(key))(value).iteritems():
-                attr = k.split('_')
-                lst = attr[-1]
-                rest = attr[:-1]
+            try:
+                alias = _ALIASES[key]
+            except KeyError:
+                alias = _sdk(key)
+            for k, v in alias(value).iteritems():
+                try:
+                    rest, lst = _LEGACY_PATHS[k]
+                except KeyError:
+                    attr = k.split('_')
+                    rest, lst = _LEGACY_PATHS[k] = tuple(attr[:-1]), attr[-1]
                 
                 # pylint: disable=E1103
                 item = queryreq.block
@@ -453,6 +648,25 @@ class VSOClient(object):
         --------
         >>> res = get(qr).wait()
         """
+        fileids, providers = VSOClient._index(query_response)
+        if not fileids:
+            res = Results(lambda _: None, 1, lambda mp: [])
+            res.poke()
+            return res
+        
+        if path is None:
+            path = os.path.join(tempfile.mkdtemp(), '{file}')
+        
+        # Like make_getdatarequest, ask for every method if none are given.
+        response = self.api.service.GetData(
+            self.create_getdatarequest(
+                providers,
+                self.method_order + ['URL'] if methods is None else methods
+            )
+        )
+        
+        # Only start a reactor thread once there is something to download;
+        # downloads scheduled before it runs are queued by call_sync.
         if downloader is None:
             downloader = download.Downloader()
             threading.Thread(target=downloader.reactor.run).start()
@@ -464,19 +678,11 @@ class VSOClient(object):
             res = Results(
                 lambda _: None, 1, lambda mp: self.link(query_response, mp)
             )
-        if path is None:
-            path = os.path.join(tempfile.mkdtemp(), '{file}')
-        fileids = VSOClient.by_fileid(query_response)
-        if not fileids:
-            res.poke()
-            return res
-        self.download_all(
-            self.api.service.GetData(
-                self.make_getdatarequest(query_response, methods)
-                ),
-            methods, downloader, path,
-            fileids, res
-        )
+        
+        # Directories only known to exist for the duration of this call, as
+        # they may be removed before the next.
+        self.download_all(response, methods, downloader, path, fileids, res,
+                          directories=set())
         res.poke()
         return res
     
@@ -500,11 +706,7 @@ class VSOClient(object):
         if methods is None:
             methods = self.method_order + ['URL']
         
-        return self.create_getdatarequest(
-            dict((k, [x.fileid for x in v])
-                 for k, v in self.by_provider(response).iteritems()),
-            methods
-        )
+        return self.create_getdatarequest(self._index(response)[1], methods)
     
     def create_getdatarequest(self, map_, methods, info=None):
         if info is None:
@@ -521,12 +723,17 @@ class VSOClient(object):
         )
     
     # pylint: disable=R0913,R0912
-    def download_all(self, response, methods, dw, path, qr, res, info=None):
+    def download_all(self, response, methods, dw, path, qr, res, info=None,
+                     directories=None):
         GET_VERSION = [
             ('0.8', (5, 8)),
             ('0.7', (1, 4)),
             ('0.6', (0, 3)),
         ]
+        # Files to request again, as (methods, info, {provider: files})
+        # triples. All providers asking for the same methods and info
+        # are sent in one request.
+        retries = []
         for dresponse in response.getdataresponseitem:
             for version, (from_, to) in GET_VERSION:
                 if getattr(dresponse, version, '0.6') >= version:
@@ -545,14 +752,18 @@ class VSOClient(object):
             if code == '200':
                 for dataitem in dresponse.getdataitem.dataitem:
                     try:
+                        # The fileids are suds Text, which hashes and
+                        # compares like the strings link looks them up with.
+                        fileids = dataitem.fileiditem.fileid
                         self.download(
                             dresponse.method.methodtype[0],
                             dataitem.url,
                             dw,
-                            res.require(map(str, dataitem.fileiditem.fileid)),
+                            res.require(fileids),
                             res.add_error,
                             path,
-                            qr[dataitem.fileiditem.fileid[0]]
+                            qr[fileids[0]],
+                            directories=directories
                         )
                     except NoData:
                         res.add_error(DownloadFailed(dresponse))
@@ -561,9 +772,10 @@ class VSOClient(object):
                         # FIXME: Is this a good idea?
                         res.add_error(DownloadFailed(dresponse))
             elif code == '300' or code == '412' or code == '405':
+                new_methods, new_info = methods, info
                 if code == '300':
                     try:
-                        methods = self.multiple_choices(
+                        new_methods = self.multiple_choices(
                             dresponse.method.methodtype, dresponse
                         )
                     except NoData:
@@ -571,7 +783,7 @@ class VSOClient(object):
                         continue
                 elif code == '412':
                     try:
-                        info = self.missing_information(
+                        new_info = self.missing_information(
                             info, dresponse.info
                         )
                     except NoData:
@@ -579,31 +791,39 @@ class VSOClient(object):
                         continue
                 elif code == '405':
                     try:
-                        methods = self.unknown_method(dresponse)
+                        new_methods = self.unknown_method(dresponse)
                     except NoData:
                         res.add_error(UnknownMethod(dresponse))
                         continue
                 
-                files = []
+                for retry_methods, retry_info, map_ in retries:
+                    if retry_methods == new_methods and retry_info == new_info:
+                        break
+                else:
+                    map_ = {}
+                    retries.append((new_methods, new_info, map_))
+                
+                files = map_.setdefault(dresponse.provider, [])
                 for dataitem in dresponse.getdataitem.dataitem:
                     files.extend(dataitem.fileiditem.fileid)
-                
-                request = self.create_getdatarequest(
-                    {dresponse.provider: files}, methods, info
-                )
-                
-                self.download_all(
-                    self.api.service.GetData(request), methods, dw, path,
-                    qr, res, info
-                )
             else:
                 res.add_error(UnknownStatus(dresponse))
+        
+        for retry_methods, retry_info, map_ in retries:
+            request = self.create_getdatarequest(
+                map_, retry_methods, retry_info
+            )
+            self.download_all(
+                self.api.service.GetData(request), retry_methods, dw, path,
+                qr, res, retry_info, directories
+            )
     
-    def download(self, method, url, dw, callback, errback, *args):
+    def download(self, method, url, dw, callback, errback, *args, **kwargs):
         """ Override to costumize download action. """
         if method.startswith('URL'):
             return dw.reactor.call_sync(
-                partial(dw.download, url, partial(self.mk_filename, *args),
+                partial(dw.download, url,
+                        partial(self.mk_filename, *args, **kwargs),
                         callback, errback)
             )
         raise NoData
@@ -611,8 +831,10 @@ class VSOClient(object):
     @staticmethod
     def by_provider(response):
         map_ = defaultdict(list)
-        for record in response:
-            map_[record.provider].append(record)
+        # Records of one provider arrive next to each other, so add them
+        # a run at a time.
+        for provider, records in groupby(response, attrgetter('provider')):
+            map_[provider].extend(records)
         return map_
     
     @staticmethod
@@ -621,6 +843,18 @@ class VSOClient(object):
             (record.fileid, record) for record in response
         )
     
+    @staticmethod
+    def _index(response):
+        """ Return both the records by fileid and the fileids by provider,
+        looking at every record only once. """
+        by_fileid = {}
+        by_provider = defaultdict(list)
+        for record in response:
+            fileid = record.fileid
+            by_fileid[fileid] = record
+            by_provider[record.provider].append(fileid)
+        return by_fileid, by_provider
+    
     # pylint: disable=W0613
     def multiple_choices(self, choices, response):
         """ Override to pick between multiple download choices. """
@@ -642,6 +876,15 @@ class VSOClient(object):
 
 class InteractiveVSOClient(VSOClient):
     """ Client for use in the REPL. Prompts user for data if required. """
+    # Results of search are reused for identical searches within cache_ttl
+    # seconds. At most cache_size of them are kept.
+    cache_ttl = 300
+    cache_size = 128
+    
+    def __init__(self, api=None, url=DEFAULT_URL, port=DEFAULT_PORT):
+        VSOClient.__init__(self, api, url, port)
+        self._search_cache = {}
+    
     def multiple_choices(self, choices, response):
         while True:
             for n, elem in enumerate(choices):
@@ -673,11 +916,39 @@ class InteractiveVSOClient(VSOClient):
     def search(self, *args, **kwargs):
         """ When passed an Attr object, perform new-style query;
         otherwise, perform legacy query.
+        
+        Repeating a search within a few minutes returns the same
+        QueryResponse object again, so it should not be modified.
         """
+        key = repr((args, sorted(kwargs.iteritems())))
+        now = time.time()
+        
+        try:
+            stamp, response = self._search_cache[key]
+        except KeyError:
+            pass
+        else:
+            if now - stamp < self.cache_ttl:
+                return response
+        
         if isinstance(args[0], Attr):
-            return self.query(*args)
+            response = self.query(*args)
         else:
-            return self.query_legacy(*args, **kwargs)
+            response = self.query_legacy(*args, **kwargs)
+        
+        if not response.errors:
+            if len(self._search_cache) >= self.cache_size:
+                oldest = min(
+                    self._search_cache,
+                    key=lambda k: self._search_cache[k][0]
+                )
+                del self._search_cache[oldest]
+            self._search_cache[key] = (now, response)
+        return response
+    
+    def clear_cache(self):
+        """ Forget the results of previous searches. """
+        self._search_cache.clear()
     
     def get(self, query_response, path=None, methods=('URL-FILE',), downloader=None):
         if path is not None:
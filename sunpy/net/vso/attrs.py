@@ -45,6 +45,9 @@ class Wave(Attr, _Range):
     
     def collides(self, other):
         return isinstance(other, self.__class__)
+    
+    def __repr__(self):
+        return '<Wave(%r, %r, %r)>' % (self.min, self.max, self.unit)
 
 
 class Time(Attr, _Range):
@@ -86,6 +89,10 @@ class Extent(Attr):
     
     def collides(self, other):
         return isinstance(other, self.__class__)
+    
+    def __repr__(self):
+        return '<Extent(%r, %r, %r, %r, %r)>' % (
+            self.x, self.y, self.width, self.length, self.type)
 
 
 class Field(ValueAttr):
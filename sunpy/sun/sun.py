@@ -50,14 +50,151 @@ __all__ = ["print_params"
 __authors__ = ["Steven Christe"]
 __email__ = "steven.d.christe@nasa.gov"
 
+import sys
 import math
-import cmath
+from datetime import datetime
 import numpy as np
 from sunpy.util import util as util
 
+# Factors converting degrees to radians and back. Multiplying by these
+# is cheaper than calling radians/degrees and gives the same results.
+_D2R = math.pi / 180.0
+_R2D = 180.0 / math.pi
+
+# Inclination of the solar equator to the ecliptic (in degrees).
+_INCLINATION = 7.25
+_SIN_I = math.sin(_INCLINATION * _D2R)
+_COS_I = math.cos(_INCLINATION * _D2R)
+_TAN_I = math.tan(_INCLINATION * _D2R)
+
+class _scalar(object):
+    """The numpy functions used below, for single values. The math module
+    versions are several times faster on floats."""
+    sin = staticmethod(math.sin)
+    cos = staticmethod(math.cos)
+    tan = staticmethod(math.tan)
+    arcsin = staticmethod(math.asin)
+    arctan = staticmethod(math.atan)
+    arctan2 = staticmethod(math.atan2)
+
+# All functions below accept a single time in any form util.anytim
+# understands, or a list or array of them (including arrays of
+# numpy.datetime64). In the latter case the results are arrays with one
+# value per time. The exception is print_params, which only takes a single
+# time.
+
+def _is_sequence(t):
+    """Return whether t is a list or array of times rather than one time."""
+    return isinstance(t, (list, np.ndarray))
+
+def _wrap360(x):
+    """Return the angle x (in degrees) reduced to [0, 360]."""
+    if isinstance(x, np.ndarray):
+        # Several times faster than np.mod, which also fixes up the sign
+        # of its result. Only differs from it in giving 360 rather than 0
+        # for tiny negative angles.
+        return x - 360.0 * np.floor(x * (1 / 360.0))
+    # For single values % is the fastest.
+    return x % 360.0
+
+def _julian_day(t):
+    """Return the Julian day of t, or an array of them."""
+    if isinstance(t, np.ndarray) and t.dtype.kind == 'M':
+        # Arrays of numpy.datetime64 are converted without going through
+        # Python objects, by counting days since the reference date of
+        # util.julian_day.
+        days = (t - np.datetime64('1900-01-01T12:00')) / np.timedelta64(1, 'D')
+        return days + util.JULIAN_DAY_ON_NOON01JAN1900
+    if _is_sequence(t):
+        return np.array([util.julian_day(time) for time in t])
+    return util.julian_day(t)
+
+class _Ephem(object):
+    """The quantities most of the functions below are derived from,
+    computed once for the time(s) t.
+    
+    The public functions also accept an _Ephem instead of a time, so the
+    ones that need several of these quantities or call each other do not
+    parse the time and evaluate the series again."""
+    __slots__ = ['t', 'xp', 'jd', 'T', 'mna', 'gml', 'eoc', 'true_long',
+                 'omega', 'app_long', 'ob']
+    
+    def __init__(self, t=None):
+        self.t = t
+        self.jd = _julian_day(t)
+        # Functions to compute with: numpy for arrays, math for single
+        # values.
+        self.xp = xp = np if isinstance(self.jd, np.ndarray) else _scalar
+        # Julian centuries since 1900 January 0.5, the epoch of the series
+        # below, as computed by util.julian_centuries for single times.
+        self.T = T = ((self.jd - util.JULIAN_DAY_ON_NOON31DEC1899) /
+                      util.DAYS_IN_JULIAN_CENTURY)
+        
+        # The series are evaluated in Horner form.
+        self.mna = mna = _wrap360(
+            358.475830 + T * (35999.049750 + T * (-0.0001500 - 0.00000330 * T))
+        )
+        self.gml = _wrap360(279.696680 + T * (36000.76892 + 0.0003025 * T))
+        # sin(2M) and sin(3M) follow from sin(M) and cos(M).
+        mna_rad = mna * _D2R
+        sin_mna = xp.sin(mna_rad)
+        cos_mna = xp.cos(mna_rad)
+        self.eoc = ((1.9194600 + T * (-0.0047890 - 0.0000140 * T)) * sin_mna +
+                    (0.0200940 - 0.0001000 * T) * 2 * sin_mna * cos_mna +
+                    0.0002930 * sin_mna * (3 - 4 * sin_mna ** 2))
+        self.true_long = _wrap360(self.eoc + self.gml)
+        self.omega = 259.18 - 1934.142 * T
+        self.app_long = (self.true_long - 0.00569 -
+                         0.00479 * xp.sin(self.omega * _D2R))
+        self.ob = (23.452294 +
+                   T * (-0.0130125 + T * (-0.00000164 + 0.000000503 * T)))
+
+_EPHEM_CACHE = {}
+_EPHEM_CACHE_SIZE = 256
+
+def _constant(t, value):
+    """Return value for a single time, or an array of it with one value per
+    time for several."""
+    if isinstance(t, _Ephem):
+        t = t.t
+    if _is_sequence(t):
+        return np.repeat(value, len(t))
+    return value
+
+def _ephem(t):
+    """Return the _Ephem for t, which may already be one."""
+    if isinstance(t, _Ephem):
+        return t
+    
+    # A single time other than the current one always gives the same
+    # ephemeris, so remember it for the next function called with t.
+    if not isinstance(t, (basestring, datetime, tuple)):
+        return _Ephem(t)
+    try:
+        return _EPHEM_CACHE[t]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable, e.g. a tuple holding a list
+        return _Ephem(t)
+    
+    e = _Ephem(t)
+    if len(_EPHEM_CACHE) >= _EPHEM_CACHE_SIZE:
+        _EPHEM_CACHE.clear()
+    _EPHEM_CACHE[t] = e
+    return e
+
 def solar_cycle_number(t=None):
-    time = util.anytim(t)
-    result = (time.year + 8) % 28 + 1
+    if isinstance(t, _Ephem):
+        t = t.t
+    if isinstance(t, np.ndarray) and t.dtype.kind == 'M':
+        # Years since 1970, without going through Python objects
+        year = t.astype('datetime64[Y]').astype(int) + 1970
+    elif _is_sequence(t):
+        year = np.array([util.anytim(time).year for time in t])
+    else:
+        year = util.anytim(t).year
+    result = (year + 8) % 28 + 1
     return result
 
 #def radius(t=None):
@@ -70,189 +207,180 @@ def angular_size(t=None):
     return result
 
 def position(t=None):
-    """Returns the position of the Sun (right ascension and declination)
-	on the celestial sphere using the equatorial coordinate system in arcsec.
+    """Returns the position of the Sun (right ascension in hours and 
+	declination in degrees) on the celestial sphere using the equatorial 
+	coordinate system.
 	"""
-    ra = true_rightascenscion(t)
-    dec = true_declination(t)
+    e = _ephem(t)
+    ra, dec = _ra_dec(e, e.ob, e.true_long)
     result = [ra,dec]
     return result
     
 def eccentricity_SunEarth_orbit(t=None):
     """Returns the eccentricity of the Sun Earth Orbit."""
-    T = util.julian_centuries(t)
-    result = 0.016751040 - 0.00004180 * T - 0.0000001260 * T ** 2
+    T = _ephem(t).T
+    result = 0.016751040 + T * (-0.00004180 - 0.0000001260 * T)
     return result
 
 def mean_ecliptic_longitude(t=None):
     """Returns the mean ecliptic longitude."""
-    T = util.julian_centuries(t)
-    result = 279.696680 + 36000.76892 * T + 0.0003025 * T ** 2
-    result = result % 360.0
-    return result
+    return _ephem(t).gml
 
 def longitude_Sun_perigee(t=None):
     """Insert text here"""
     # T = util.julian_centuries(t)
-    return 1
+    return _constant(t, 1)
     
 def mean_anomaly(t=None):
     """Returns the mean anomaly (the angle through which the Sun has moved
     assuming a circular orbit) as a function of time."""
-    T = util.julian_centuries(t)
-    result = 358.475830 + 35999.049750 * T - 0.0001500 * T ** 2 - 0.00000330 * T ** 3
-    result = result % 360.0
-    return result
+    return _ephem(t).mna
 
 def carrington_rotation_number(t=None):
     """Return the Carrington Rotation number"""
-    jd = util.julian_day(t)
+    jd = _ephem(t).jd
     result = (1. / 27.2753) * (jd - 2398167.0) + 1.0
     return result
 
 def geometric_mean_longitude(t=None):
     """Returns the geometric mean longitude (in degrees)"""   
-    T = util.julian_centuries(t)
-    result = 279.696680 + 36000.76892 * T + 0.0003025 * T ** 2
-    result = result % 360.0
-    return result
+    return _ephem(t).gml
   
 def equation_of_center(t=None):
     """Returns the Sun's equation of center (in degrees)"""
-    T = util.julian_centuries(t)
-    mna = mean_anomaly(t) 
-    result = ((1.9194600 - 0.0047890 * T - 0.0000140 * T
-    ** 2) * np.sin(np.radians(mna) + (0.0200940 - 0.0001000 * T) *
-    np.sin(np.radians(2 * mna)) + 0.0002930 * np.sin(np.radians(3 * mna))))
-    return result
+    return _ephem(t).eoc
 
 def true_longitude(t=None): 
     """Returns the Sun's true geometric longitude (in degrees) 
     (Refered to the mean equinox of date.  Question: Should the higher
     accuracy terms from which app_long is derived be added to true_long?)"""
-    result = (equation_of_center(t) + geometric_mean_longitude(t)) % 360.0
-    return result
+    return _ephem(t).true_long
 
 def true_anomaly(t=None):
     """Returns the Sun's true anomaly (in degress)."""
-    result = (mean_anomaly(t) + equation_of_center(t)) % 360.0
+    e = _ephem(t)
+    result = _wrap360(e.mna + e.eoc)
     return result
 
 def sunearth_distance(t=None):
     """Returns the Sun Earth distance. There are a set of higher accuracy terms not included here."""  
-    ta = true_anomaly(t)
-    e = eccentricity_SunEarth_orbit(t)
-    result = 1.00000020 * (1.0 - e ** 2) / (1.0 + e * math.cos(np.radians(ta)))
+    e = _ephem(t)
+    xp = e.xp
+    ta = true_anomaly(e)
+    ecc = eccentricity_SunEarth_orbit(e)
+    result = 1.00000020 * (1.0 - ecc ** 2) / (1.0 + ecc * xp.cos(ta * _D2R))
     return result
 
 def apparent_longitude(t=None):
     """Returns the apparent longitude of the Sun."""
-    T = util.julian_centuries(t)
-    omega = 259.18 - 1934.142*T
-    true_long = true_longitude(t)        
-    result = true_long - 0.00569 - 0.00479*math.sin(np.radians(omega))
-    return result
+    return _ephem(t).app_long
 
 def true_latitude(t=None):
     '''Returns the true latitude. Never more than 1.2 arcsec from 0, set to 0 here.'''
-    return 0.0
+    return _constant(t, 0.0)
 
 def apparent_latitude(t=None):
-    return 0
+    return _constant(t, 0)
 
 def true_obliquity_of_ecliptic(t=None):
-    T = util.julian_centuries(t)
-    result = 23.452294 - 0.0130125 * T - 0.00000164 * T ** 2 + 0.000000503 * T ** 3
-    return result
+    return _ephem(t).ob
+
+def _ra_dec(e, ob, lon):
+    """Return the right ascension (in hours) and declination (in degrees)
+    of the ecliptic longitude lon for the obliquity ob (both in degrees),
+    sharing sin(lon) between them."""
+    xp = e.xp
+    ob = ob * _D2R
+    lon = lon * _D2R
+    sin_lon = xp.sin(lon)
+    ra = _wrap360(xp.arctan2(xp.cos(ob) * sin_lon, xp.cos(lon)) * _R2D) / 15.0
+    dec = xp.arcsin(xp.sin(ob) * sin_lon) * _R2D
+    return ra, dec
 
 def true_rightascenscion(t=None):
-    true_long = true_longitude(t)
-    ob = true_obliquity_of_ecliptic(t)
-    result = math.cos(np.radians(ob))*math.sin(np.radians(true_long))
-    return result
+    """Returns the true right ascenscion of the Sun (in hours)."""
+    e = _ephem(t)
+    return _ra_dec(e, e.ob, e.true_long)[0]
 
 def true_declination(t=None):
-    result = math.cos(np.radians(true_longitude(t)))
-    return result
+    """Returns the true declination of the Sun (in degrees)."""
+    e = _ephem(t)
+    return _ra_dec(e, e.ob, e.true_long)[1]
 
 def apparent_obliquity_of_ecliptic(t=None):
-    omega = apparent_longitude(t)
-    result = true_obliquity_of_ecliptic(t) + 0.00256 * math.cos(np.radians(omega))
+    e = _ephem(t)
+    xp = e.xp
+    result = e.ob + 0.00256 * xp.cos(e.omega * _D2R)
     return result
 
 def apparent_rightascenscion(t=None):
-    """Returns the apparent right ascenscion of the Sun."""
-    y = math.cos(np.radians(apparent_obliquity_of_ecliptic(t))) * math.sin(np.radians(apparent_longitude(t)))
-    x = math.cos(np.radians(apparent_longitude(t)))
-    rpol = cmath.polar(complex(x,y))
-    app_ra = rpol[1] % 360.0
-    if app_ra < 0: app_ra += 360.0
-    result = app_ra/15.0
-    return result
+    """Returns the apparent right ascenscion of the Sun (in hours)."""
+    e = _ephem(t)
+    return _ra_dec(e, apparent_obliquity_of_ecliptic(e), e.app_long)[0]
 
 def apparent_declination(t=None):
-    """Returns the apparent declination of the Sun."""
-    ob = apparent_obliquity_of_ecliptic(t)
-    app_long = apparent_longitude(t)
-    result = np.degrees(math.asin(math.sin(np.radians(ob)))*math.sin(np.radians(app_long)))
-    return result
+    """Returns the apparent declination of the Sun (in degrees)."""
+    e = _ephem(t)
+    return _ra_dec(e, apparent_obliquity_of_ecliptic(e), e.app_long)[1]
 
 def solar_north(t=None):
     """Returns the position of the Solar north pole in degrees."""
-    T = util.julian_centuries(t)
-    ob1 = true_obliquity_of_ecliptic(t)
-    # in degrees
-    i = 7.25
+    e = _ephem(t)
+    xp = e.xp
+    T = e.T
+    ob1 = e.ob
     k = 74.3646 + 1.395833 * T
-    lamda = true_longitude(t) - 0.00569
-    omega = apparent_longitude(t)
-    lamda2 = lamda - 0.00479 * math.sin(np.radians(omega))
-    diff = np.radians(lamda - k)
-    x = np.degrees(math.atan(-math.cos(np.radians(lamda2)*math.tan(np.radians(ob1)))))
-    y = np.degrees(math.atan(-math.cos(diff)*math.tan(np.radians(i))))
+    lamda = e.true_long - 0.00569
+    lamda2 = lamda - 0.00479 * xp.sin(e.omega * _D2R)
+    diff = (lamda - k) * _D2R
+    x = xp.arctan(-xp.cos(lamda2 * _D2R)*xp.tan(ob1 * _D2R)) * _R2D
+    y = xp.arctan(-xp.cos(diff)*_TAN_I) * _R2D
     result = x + y
     return result
 
 def heliographic_solar_center(t=None):
     """Returns the position of the solar center in heliographic coordinates."""
-    jd = util.julian_day(t)
-    T = util.julian_centuries(t)
+    e = _ephem(t)
+    xp = e.xp
+    jd = e.jd
+    T = e.T
     # Heliographic coordinates in degrees
     theta = (jd - 2398220)*360/25.38
-    i = 7.25
     k = 74.3646 + 1.395833 * T
-    lamda = true_longitude(t) - 0.00569
-    omega = apparent_longitude(t)
-    lamda2 = lamda - 0.00479 * math.sin(np.radians(omega))
-    diff = np.radians(lamda - k)
+    lamda = e.true_long - 0.00569
+    diff = (lamda - k) * _D2R
+    sin_diff = xp.sin(diff)
     # Latitude at center of disk (deg):    
-    he_lat = np.degrees(math.asin(math.sin(diff)*math.sin(np.radians(i))))
+    he_lat = xp.arcsin(sin_diff*_SIN_I) * _R2D
     # Longitude at center of disk (deg):
-    y = -math.sin(diff)*math.cos(np.radians(i))
-    x = -math.cos(diff)
-    rpol = cmath.polar(complex(x,y))
-    he_lon = np.degrees(rpol[1]) - theta
-    he_lon = he_lon % 360
-    if he_lon < 0:
-        he_lon = he_lon + 360.0
+    y = -sin_diff*_COS_I
+    x = -xp.cos(diff)
+    he_lon = _wrap360(xp.arctan2(y, x) * _R2D - theta)
 
     return [he_lon, he_lat]
 
 def print_params(t=None):
-    """Print out a summary of Solar ephemeris"""
+    """Print out a summary of Solar ephemeris for a single time"""
     time = util.anytim(t)
-    print('Solar Ephemeris for ' + time.ctime())
-    print('')
-    print('Distance (AU) = ' + str(sunearth_distance(t)))
-    print('Semidiameter (arc sec) = ' + str(angular_size(t)))
-    print('True (long,lat) in degrees = (' + str(true_longitude(t)) + ',' 
-                                                 + str(true_latitude(t)) + ')')
-    print('Apparent (long, lat) in degrees = (' + str(apparent_longitude(t)) + ',' 
-                                                 + str(apparent_latitude(t)) + ')')
-    print('True (RA, Dec) = (' + str(true_rightascenscion(t)) + ','
-          + str(true_declination(t)))
-    print('Apparent (RA, Dec) = (' + str(apparent_rightascenscion(t)) + ','
-          + str(apparent_declination(t)))
-    print('Heliographic long. and lat of disk center in deg = (' + str(heliographic_solar_center(t)) + ')')
-    print('Position angle of north pole in deg = ' + str(solar_north(t)))
-    print('Carrington Rotation Number = ' + str(carrington_rotation_number(t)))
+    # Evaluate the ephemeris for the parsed time, so that all values
+    # refer to the same moment even if t is None.
+    e = _Ephem(time)
+    true_ra, true_dec = _ra_dec(e, e.ob, e.true_long)
+    app_ra, app_dec = _ra_dec(e, apparent_obliquity_of_ecliptic(e), e.app_long)
+    lines = [
+        'Solar Ephemeris for %s' % time.ctime(),
+        '',
+        'Distance (AU) = %s' % sunearth_distance(e),
+        'Semidiameter (arc sec) = %s' % angular_size(e),
+        'True (long,lat) in degrees = (%s,%s)' % (true_longitude(e),
+                                                  true_latitude(e)),
+        'Apparent (long, lat) in degrees = (%s,%s)' % (apparent_longitude(e),
+                                                       apparent_latitude(e)),
+        'True (RA, Dec) = (%s,%s' % (true_ra, true_dec),
+        'Apparent (RA, Dec) = (%s,%s' % (app_ra, app_dec),
+        'Heliographic long. and lat of disk center in deg = (%s)' % (
+            heliographic_solar_center(e),),
+        'Position angle of north pole in deg = %s' % solar_north(e),
+        'Carrington Rotation Number = %s' % carrington_rotation_number(e),
+    ]
+    sys.stdout.write('\n'.join(lines) + '\n')
@@ -8,77 +8,99 @@ import sunpy
 import pyfits
 import numpy as np
 
-class TestBaseMap:
-    """Tests the BaseMap class"""
-    def setup_class(self):
-        self.file = sunpy.AIA_171_IMAGE
-        self.map = sunpy.make_map(self.file)
-        self.fits = pyfits.open(self.file)
-        self.fits.verify('silentfix')
+def pytest_funcarg__aia_map(request):
+    """The AIA test image as a map, read once per session"""
+    return request.cached_setup(
+        setup=lambda: sunpy.make_map(sunpy.AIA_171_IMAGE), scope='session'
+    )
 
-    def teardown_class(self):
-        self.map = None
-        self.fits = None
+def pytest_funcarg__aia_fits(request):
+    """The AIA test image opened with pyfits, read once per session"""
+    def setup():
+        fits = pyfits.open(sunpy.AIA_171_IMAGE)
+        fits.verify('silentfix')
         
-    def test_data_to_pixel(self):
-        """Make sure conversion from data units to pixels is accurate"""
-        # Check conversion of reference pixel
-        # Note: FITS pixels starts from 1,1
-        assert self.map.data_to_pixel(self.map.header['crval1'], 'x') == self.map.header['crpix1'] - 1
-        assert self.map.data_to_pixel(self.map.header['crval2'], 'y') == self.map.header['crpix2'] - 1
-        
-        # Check conversion of map center
-        assert self.map.data_to_pixel(self.map.center['x'], 'x') == (self.map.header['naxis1'] - 1) / 2.
-        assert self.map.data_to_pixel(self.map.center['y'], 'y') == (self.map.header['naxis2'] - 1) / 2.
-        
-        # Check conversion of map edges
-        # Note: data coords are at pixel centers, so edges are 0.5 pixels wider
-        assert self.map.data_to_pixel(self.map.xrange[0], 'x') == 0. - 0.5
-        assert self.map.data_to_pixel(self.map.yrange[0], 'y') == 0. - 0.5
-        assert self.map.data_to_pixel(self.map.xrange[1], 'x') == (self.map.header['naxis1'] - 1) + 0.5
-        assert self.map.data_to_pixel(self.map.yrange[1], 'y') == (self.map.header['naxis2'] - 1) + 0.5
+        # Access fits data once to apply scaling-related changes and update
+        # header information in fits[0].header
+        fits[0].data #pylint: disable=W0104
+        return fits
+    return request.cached_setup(
+        setup=setup, teardown=lambda fits: fits.close(), scope='session'
+    )
+
+def test_data_to_pixel(aia_map):
+    """Make sure conversion from data units to pixels is accurate"""
+    header = aia_map.header
+    center = aia_map.center
+    xrange_, yrange_ = aia_map.xrange, aia_map.yrange
+    naxis1, naxis2 = header['naxis1'], header['naxis2']
     
-    def test_data_range(self):
-        """Make sure xrange and yrange work"""
-        assert self.map.xrange[1] - self.map.xrange[0] == self.map.header['cdelt1'] * self.map.header['naxis1']
-        assert self.map.yrange[1] - self.map.yrange[0] == self.map.header['cdelt2'] * self.map.header['naxis2']
-        
-        assert np.average(self.map.xrange) == self.map.center['x']
-        assert np.average(self.map.yrange) == self.map.center['y']
-        
-    def test_submap(self):
-        """Check data and header information for a submap"""
-        width = self.map.shape[1]
-        height = self.map.shape[0]
+    # Check conversion of reference pixel
+    # Note: FITS pixels starts from 1,1
+    assert aia_map.data_to_pixel(header['crval1'], 'x') == header['crpix1'] - 1
+    assert aia_map.data_to_pixel(header['crval2'], 'y') == header['crpix2'] - 1
+    
+    # Check conversion of map center
+    assert aia_map.data_to_pixel(center['x'], 'x') == (naxis1 - 1) / 2.
+    assert aia_map.data_to_pixel(center['y'], 'y') == (naxis2 - 1) / 2.
+    
+    # Check conversion of map edges
+    # Note: data coords are at pixel centers, so edges are 0.5 pixels wider
+    assert aia_map.data_to_pixel(xrange_[0], 'x') == 0. - 0.5
+    assert aia_map.data_to_pixel(yrange_[0], 'y') == 0. - 0.5
+    assert aia_map.data_to_pixel(xrange_[1], 'x') == (naxis1 - 1) + 0.5
+    assert aia_map.data_to_pixel(yrange_[1], 'y') == (naxis2 - 1) + 0.5
 
-        # Create a submap of the top-right quadrant of the image
-        submap = self.map[height/2:height, width/2:width]
-        
-        # Expected offset for center
-        offset = {
-            "x": self.map.header.get('crpix1') - width / 2,
-            "y": self.map.header.get('crpix2') - height / 2,
-        }
-        
-        # Check to see if submap header was updated properly
-        assert submap.header.get('crpix1') == offset['x'] 
-        assert submap.header.get('crpix1') == offset['y']
-        assert submap.header.get('naxis1') == width / 2
-        assert submap.header.get('naxis2') == height / 2
-        
-        # Check data
-        assert (np.asarray(self.map)[height/2:height, 
-                                     width/2:width] == submap).all()
-        
-    def test_fits_data_comparison(self):
-        """Make sure the data is the same in pyfits and SunPy"""
-        assert (self.map == self.fits[0].data).all()
+def test_data_range(aia_map):
+    """Make sure xrange and yrange work"""
+    header = aia_map.header
+    center = aia_map.center
+    xrange_, yrange_ = aia_map.xrange, aia_map.yrange
+    
+    assert xrange_[1] - xrange_[0] == header['cdelt1'] * header['naxis1']
+    assert yrange_[1] - yrange_[0] == header['cdelt2'] * header['naxis2']
+    
+    assert 0.5 * (xrange_[0] + xrange_[1]) == center['x']
+    assert 0.5 * (yrange_[0] + yrange_[1]) == center['y']
+    
+def test_submap(aia_map):
+    """Check data and header information for a submap"""
+    height, width = aia_map.shape[:2]
+    header = aia_map.header
 
-    def test_fits_header_comparison(self):
-        """Make sure the header is the same in pyfits and SunPy"""
+    # Create a submap of the top-right quadrant of the image
+    submap = aia_map[height/2:height, width/2:width]
+    subheader = submap.header
+    
+    # Expected offset for center
+    offset = {
+        "x": header.get('crpix1') - width / 2,
+        "y": header.get('crpix2') - height / 2,
+    }
+    
+    # Check to see if submap header was updated properly
+    assert subheader.get('crpix1') == offset['x'] 
+    assert subheader.get('crpix1') == offset['y']
+    assert subheader.get('naxis1') == width / 2
+    assert subheader.get('naxis2') == height / 2
+    
+    # Check data
+    assert np.array_equal(np.asarray(aia_map)[height/2:height, width/2:width],
+                          np.asarray(submap))
+    
+def test_fits_data_comparison(aia_map, aia_fits):
+    """Make sure the data is the same in pyfits and SunPy"""
+    assert np.array_equal(np.asarray(aia_map), aia_fits[0].data)
 
-        # Access fits data once to apply scaling-related changes and update
-        # header information in fits[0].header
-        self.fits[0].data #pylint: disable=W0104
-        
-        assert dict(self.map.header) == dict(self.fits[0].header)
+def test_fits_header_comparison(aia_map, aia_fits):
+    """Make sure the header is the same in pyfits and SunPy"""
+    header = aia_map.header
+    
+    # Compare card by card; for repeated keys such as COMMENT, the map
+    # header keeps the value of the last card
+    keys = set()
+    for key, value in reversed(aia_fits[0].header.items()):
+        if key not in keys:
+            keys.add(key)
+            assert header[key] == value
+    assert len(header) == len(keys)
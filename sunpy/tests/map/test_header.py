@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+
+import pytest
+
+import sunpy
+from sunpy.map.header import MapHeader
+
+def pytest_funcarg__header(request):
+    return MapHeader({'naxis': 2, 'Cdelt1': 0.6, 'CRPIX1': 512.5})
+
+def test_keys_stored_upper(header):
+    assert sorted(header.keys()) == ['CDELT1', 'CRPIX1', 'NAXIS']
+
+def test_getitem(header):
+    assert header['NAXIS'] == header['naxis'] == header['NaXiS'] == 2
+
+def test_contains(header):
+    assert 'cdelt1' in header
+    assert 'CDELT1' in header
+    assert 'cdelt2' not in header
+    assert header.has_key('crpix1')
+
+def test_get(header):
+    assert header.get('crpix1') == 512.5
+    assert header.get('crpix2') is None
+    assert header.get('crpix2', 0) == 0
+
+def test_setitem(header):
+    header['date-obs'] = '2011-03-19T10:54:00'
+    assert header['DATE-OBS'] == '2011-03-19T10:54:00'
+    assert 'date-obs' not in dict(header)
+
+def test_pop(header):
+    assert header.pop('naxis') == 2
+    assert 'NAXIS' not in header
+    assert header.pop('naxis') is None
+
+def test_setdefault(header):
+    assert header.setdefault('naxis', 3) == 2
+    assert header.setdefault('crval1', 0.0) == 0.0
+    assert header['CRVAL1'] == 0.0
+
+def test_update(header):
+    header.update({'naxis': 3, 'bunit': 'DN'})
+    assert header['NAXIS'] == 3
+    assert header['BUNIT'] == 'DN'
+
+def test_copy(header):
+    other = header.copy()
+    assert isinstance(other, MapHeader)
+    assert other == header
+    other['naxis'] = 3
+    assert header['naxis'] == 2
+
+def test_from_header(header):
+    other = MapHeader(header)
+    assert other == header
+    assert other['cdelt1'] == 0.6
+
+def test_from_file():
+    header = MapHeader.from_file(sunpy.AIA_171_IMAGE)
+    assert header['telescop'] == 'SDO/AIA'
+
+def test_from_path():
+    error = pytest.raises(TypeError, MapHeader, sunpy.AIA_171_IMAGE)
+    assert 'from_file' in str(error.value)
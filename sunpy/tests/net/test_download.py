@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+
+import urlparse
+from functools import partial
+
+from sunpy.net import download
+
+class _StubDownloader(download.Downloader):
+    """ Counts connections like Downloader, but only records the downloads
+    it starts instead of opening them. """
+    def __init__(self, *args):
+        download.Downloader.__init__(self, *args)
+        self.started = []
+        self.finish = {}
+
+    def _start_download(self, url, path, callback, errback):
+        server = urlparse.urlsplit(url).netloc
+
+        self.connections[server] += 1
+        self.conns += 1
+
+        self.started.append(url)
+        self.finish[url] = partial(
+            self._close, callback, [{'path': url}], server
+        )
+
+
+def pytest_funcarg__downloader(request):
+    return _StubDownloader(1, 2)
+
+
+def test_hosts_separate_slots(downloader):
+    done = []
+    for url in ['http://a.org/1', 'http://a.org/2', 'http://b.org/1']:
+        downloader.download(url, None, done.append, None)
+
+    # One connection per host, so the second file from a.org waits.
+    assert downloader.started == ['http://a.org/1', 'http://b.org/1']
+    assert downloader.connections['a.org'] == 1
+    assert downloader.connections['b.org'] == 1
+    assert downloader.conns == 2
+
+
+def test_slots_released(downloader):
+    done = []
+    for url in ['http://a.org/1', 'http://a.org/2', 'http://b.org/1',
+                'http://b.org/2', 'http://c.org/1']:
+        downloader.download(url, None, done.append, None)
+    assert downloader.conns == 2
+
+    # Finish whatever is running until everything has been downloaded.
+    while len(done) < 5:
+        running = [url for url in downloader.started
+                   if {'path': url} not in done]
+        downloader.finish[running[0]]()
+        assert downloader.conns <= 2
+        assert all(n <= 1 for n in downloader.connections.itervalues())
+
+    assert sorted(downloader.started) == sorted(d['path'] for d in done)
+    assert downloader.conns == 0
+    assert all(n == 0 for n in downloader.connections.itervalues())
@@ -0,0 +1,307 @@
+from __future__ import absolute_import
+
+import os
+import json
+import shutil
+import tempfile
+import datetime
+import time
+import urllib
+import urllib2
+import httplib
+import StringIO
+import threading
+import BaseHTTPServer
+
+import pytest
+
+from sunpy.net import helioviewer
+
+SOURCES = {"SDO": {"AIA": {"AIA": {"171": {"sourceId": 10}}}}}
+
+def pytest_funcarg__fake_api(request):
+    """Replaces the API request function with one that counts its calls"""
+    calls = []
+    def _request(params):
+        calls.append(params)
+        return json.dumps(SOURCES)
+
+    tmpdir = tempfile.mkdtemp()
+    original = helioviewer._request, helioviewer._CACHE_DIR
+    helioviewer._request = _request
+    helioviewer._CACHE_DIR = os.path.join(tmpdir, "cache")
+
+    def teardown():
+        helioviewer._request, helioviewer._CACHE_DIR = original
+        shutil.rmtree(tmpdir)
+    request.addfinalizer(teardown)
+    return calls
+
+def test_data_sources_cached(fake_api):
+    assert helioviewer.get_data_sources() == SOURCES
+    assert helioviewer.get_data_sources() == SOURCES
+    assert len(fake_api) == 1
+
+def test_data_sources_force_refresh(fake_api):
+    helioviewer.get_data_sources()
+    helioviewer.get_data_sources(force_refresh=True)
+    assert len(fake_api) == 2
+
+def test_data_sources_expired(fake_api):
+    helioviewer.get_data_sources()
+
+    cache = helioviewer._cache_path("datasources",
+                                    {"action": "getDataSources"})
+    old = os.path.getmtime(cache) - helioviewer._CACHE_TTL - 1
+    os.utime(cache, (old, old))
+
+    helioviewer.get_data_sources()
+    assert len(fake_api) == 2
+
+def test_data_sources_keyed_on_params(fake_api):
+    helioviewer.get_data_sources()
+    helioviewer.get_data_sources(verbose=True)
+    assert len(fake_api) == 2
+
+def test_xml_dict_config():
+    root = helioviewer.ElementTree.XML(
+        '<meta><fits><NAXIS>2</NAXIS><CDELT1>0.6</CDELT1></fits>'
+        '<history><line>a</line><line>b</line></history>'
+        '<source id="10"/><empty/></meta>'
+    )
+    assert helioviewer.XmlDictConfig(root) == {
+        'fits': {'NAXIS': '2', 'CDELT1': '0.6'},
+        'history': {'line': ['a', 'b']},
+        'source': {'id': '10'},
+        'empty': None
+    }
+
+def test_get_filename():
+    filename = "2011_03_19__10_54_00_12__SDO_AIA_AIA_171.jp2"
+    assert helioviewer._get_filename(
+        'attachment; filename="%s"' % filename) == filename
+    assert helioviewer._get_filename(
+        'attachment;filename=%s' % filename) == filename
+
+def test_format_date():
+    expected = "2011-03-19T10:54:00.000Z"
+    assert helioviewer._format_date("2011/03/19 10:54:00") == expected
+    assert helioviewer._format_date("2011/03/19 10:54:00") == expected
+    assert helioviewer._format_date((2011, 3, 19, 10, 54)) == expected
+
+def test_closest_image_cached(fake_api):
+    source = ("SDO", "AIA", "AIA", "171")
+    helioviewer.get_closest_image("2011/03/19 10:54:00", *source)
+    helioviewer.get_closest_image("2011/03/19 10:54:00", *source)
+    assert len(fake_api) == 1
+    assert fake_api[0]["action"] == "getClosestImage"
+
+    helioviewer.get_closest_image("2011/03/19 10:55:00", *source)
+    helioviewer.get_closest_image("2011/03/19 10:54:00", *source,
+                                  force_refresh=True)
+    assert len(fake_api) == 3
+
+def test_closest_image_date_parsed_once(fake_api):
+    calls = []
+    def anytim(date):
+        calls.append(date)
+        return original(date)
+    
+    original = helioviewer.util.anytim
+    helioviewer.util.anytim = anytim
+    try:
+        helioviewer._DATE_CACHE.clear()
+        source = ("SDO", "AIA", "AIA", "171")
+        helioviewer.get_closest_image("2011/03/19 10:54:00", *source)
+        helioviewer.get_closest_image("2011/03/19 10:54:00", *source)
+    finally:
+        helioviewer.util.anytim = original
+    assert calls == ["2011/03/19 10:54:00"]
+
+def test_closest_image_recent_not_cached(fake_api):
+    source = ("SDO", "AIA", "AIA", "171")
+    date = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    helioviewer.get_closest_image(date, *source)
+    helioviewer.get_closest_image(date, *source)
+    assert len(fake_api) == 2
+    assert not os.path.exists(helioviewer._CACHE_DIR)
+
+def test_cache_private(fake_api):
+    helioviewer.get_data_sources()
+    assert os.stat(helioviewer._CACHE_DIR).st_mode & 0777 == 0700
+
+def test_cache_pruned(fake_api):
+    original = helioviewer._CACHE_SIZE, helioviewer._PRUNE_INTERVAL
+    helioviewer._CACHE_SIZE, helioviewer._PRUNE_INTERVAL = 2, 1
+    try:
+        helioviewer.get_data_sources()
+        expired = helioviewer._cache_path("datasources",
+                                          {"action": "getDataSources"})
+        old = os.path.getmtime(expired) - helioviewer._CACHE_TTL - 1
+        os.utime(expired, (old, old))
+        
+        for n in range(3):
+            helioviewer.get_data_sources(n=n)
+            mtime = time.time() - 10 + n
+            os.utime(helioviewer._cache_path(
+                "datasources", {"action": "getDataSources", "n": n}
+            ), (mtime, mtime))
+        helioviewer.get_data_sources(n=3)
+    finally:
+        helioviewer._CACHE_SIZE, helioviewer._PRUNE_INTERVAL = original
+    
+    assert sorted(os.listdir(helioviewer._CACHE_DIR)) == sorted(
+        os.path.basename(helioviewer._cache_path(
+            "datasources", {"action": "getDataSources", "n": n}))
+        for n in (2, 3)
+    )
+
+def test_cache_pruned_occasionally(fake_api):
+    prunes = []
+    original = (helioviewer._prune_cache, helioviewer._PRUNE_INTERVAL,
+                helioviewer._cache_writes)
+    helioviewer._prune_cache = lambda: prunes.append(True)
+    helioviewer._PRUNE_INTERVAL, helioviewer._cache_writes = 3, 0
+    try:
+        for n in range(7):
+            helioviewer.get_data_sources(n=n)
+    finally:
+        (helioviewer._prune_cache, helioviewer._PRUNE_INTERVAL,
+         helioviewer._cache_writes) = original
+    
+    # Pruned on the first, fourth and seventh writes
+    assert len(prunes) == 3
+
+def pytest_funcarg__environ(request):
+    """Restores os.environ after the test, which starts without proxies"""
+    environ = dict(os.environ)
+    for key in environ:
+        if key.lower().endswith("_proxy"):
+            del os.environ[key]
+    
+    def teardown():
+        os.environ.clear()
+        os.environ.update(environ)
+    request.addfinalizer(teardown)
+    return os.environ
+
+def pytest_funcarg__fake_urlopen(request):
+    """Replaces urllib2.urlopen with one that records its arguments"""
+    calls = []
+    def urlopen(url, data=None, timeout=None):
+        calls.append((url, data, timeout))
+        headers = httplib.HTTPMessage(StringIO.StringIO(
+            'Content-Disposition: attachment; filename="a.jp2"\r\n\r\n'))
+        return urllib.addinfourl(StringIO.StringIO("{}"), headers, url)
+    
+    original = urllib2.urlopen
+    urllib2.urlopen = urlopen
+    
+    def teardown():
+        urllib2.urlopen = original
+    request.addfinalizer(teardown)
+    return calls
+
+def test_pool_proxy(environ, fake_urlopen):
+    environ["http_proxy"] = "http://proxy.local:3128"
+    environ["no_proxy"] = "localhost"
+    
+    pool = helioviewer._ConnectionPool("http://helioviewer.org/api/")
+    conn, response = pool.request({"action": "a"})
+    assert conn is None
+    assert response.read() == "{}"
+    assert response.getheader("Content-Disposition") == (
+        'attachment; filename="a.jp2"')
+    assert fake_urlopen == [("http://helioviewer.org/api/", "action=a", 30)]
+    pool.release(conn)
+    
+    assert not helioviewer._ConnectionPool("http://localhost/api/")._use_proxy()
+
+class _FakeResponse(object):
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Found"
+        self.msg = {}
+
+class _FakeConnection(object):
+    def __init__(self, status):
+        self.status = status
+        self.closed = False
+    
+    def request(self, *args):
+        pass
+    
+    def getresponse(self):
+        return _FakeResponse(self.status)
+    
+    def close(self):
+        self.closed = True
+
+def test_pool_redirect(environ, fake_urlopen):
+    pool = helioviewer._ConnectionPool("http://helioviewer.org/api/")
+    conn = _FakeConnection(302)
+    pool._get = lambda: conn
+    
+    # The redirect is left to urllib2, which follows it
+    assert pool.request({"action": "a"})[0] is None
+    assert conn.closed
+    assert fake_urlopen == [("http://helioviewer.org/api/", "action=a", 30)]
+
+class _RedirectHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(302)
+        self.send_header("Location", "/new/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.write("done")
+    
+    def log_message(self, *args):
+        pass
+
+def test_pool_redirect_followed(environ):
+    server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _RedirectHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+    try:
+        pool = helioviewer._ConnectionPool(
+            "http://127.0.0.1:%d/api/" % server.server_port)
+        conn, response = pool.request({"action": "a"})
+        assert response.read() == "done"
+        pool.release(conn)
+    finally:
+        server.shutdown()
+
+def pytest_funcarg__fake_jp2(request):
+    """Replaces get_jp2_image with one that returns the date and directory
+    after a delay that is longer for earlier dates, and fails for "bad"."""
+    def get_jp2_image(date, directory=None, **kwargs):
+        if date == "bad":
+            raise ValueError(date)
+        time.sleep(0.01 * (5 - int(date)))
+        return date, directory, kwargs
+    
+    original = helioviewer.get_jp2_image
+    helioviewer.get_jp2_image = get_jp2_image
+    
+    def teardown():
+        helioviewer.get_jp2_image = original
+    request.addfinalizer(teardown)
+
+def test_jp2_images_ordered(fake_jp2):
+    dates = ["1", "2", "3", "4", "5"]
+    assert helioviewer.get_jp2_images(dates, "dir", max_workers=3,
+                                      jpip=True) == [
+        (date, "dir", {"jpip": True}) for date in dates
+    ]
+
+def test_jp2_images_error(fake_jp2):
+    error = pytest.raises(ValueError, helioviewer.get_jp2_images,
+                          ["1", "bad", "2"])
+    assert error.value.args == ("bad",)
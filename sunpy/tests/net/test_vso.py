@@ -5,6 +5,8 @@
 
 from __future__ import absolute_import
 
+import time
+
 import pytest
 
 from sunpy.net import vso
@@ -25,6 +27,102 @@ def pytest_funcarg__iclient(request):
     return vso.InteractiveVSOClient()
 
 
+class _FakeFactory(object):
+    """ Creates the VSO types as plain suds objects, without the WSDL. """
+    def create(self, type_):
+        from suds.sudsobject import Factory
+        
+        if type_ == 'VSOGetDataRequest':
+            return Factory.object(type_, {'request': Factory.object(
+                'VSOGetDataRequestBlock', {
+                    'method': Factory.object('MethodTypes'),
+                    'info': Factory.object('Info'),
+                    'datacontainer': Factory.object('DataContainer'),
+                }
+            )})
+        if type_ == 'DataRequestItem':
+            return Factory.object(type_, {
+                'fileiditem': Factory.object('FileIdArray')
+            })
+        return Factory.object(type_)
+
+
+class _FakeService(object):
+    """ Records the GetData requests and returns empty responses, or the
+    ones queued in the responses attribute. Queries return one record per
+    instrument of the blocks; the instrument 'missing' raises
+    TypeNotFound, 'broken' raises ValueError and 'slow' takes a while. """
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        self.queries = []
+    
+    def GetData(self, request):
+        from suds.sudsobject import Factory
+        
+        self.requests.append(request)
+        if self.responses:
+            return self.responses.pop(0)
+        return Factory.object('VSOGetDataResponse', {'getdataresponseitem': []})
+    
+    def Query(self, request):
+        from suds.sudsobject import Factory
+        
+        blocks = request.block
+        if not isinstance(blocks, list):
+            blocks = [blocks]
+        instruments = [block.instrument for block in blocks]
+        self.queries.append(instruments)
+        
+        if 'missing' in instruments:
+            raise vso.TypeNotFound('missing')
+        if 'broken' in instruments:
+            raise ValueError('broken')
+        if 'slow' in instruments:
+            time.sleep(0.05)
+        return Factory.object('QueryResponse', {'provideritem': [
+            _provideritem(instrument, [instrument])
+            for instrument in instruments
+        ]})
+
+
+class _FakeAPI(object):
+    """ Clones share the service, but are recorded in the clones
+    attribute of the API they were made from. """
+    def __init__(self, service=None):
+        self.factory = _FakeFactory()
+        self.service = _FakeService() if service is None else service
+        self.clones = []
+    
+    def clone(self):
+        api = _FakeAPI(self.service)
+        self.clones.append(api)
+        return api
+
+
+def pytest_funcarg__fake_client(request):
+    return vso.VSOClient(_FakeAPI())
+
+
+def test_client_from_get_client():
+    calls = []
+    def get_client(url, port):
+        calls.append((url, port))
+        return _FakeAPI()
+    
+    original = vso._get_client
+    vso._get_client = get_client
+    try:
+        assert isinstance(vso.VSOClient().api, _FakeAPI)
+        vso.InteractiveVSOClient(url='http://example.org/vso.wsdl', port='x')
+    finally:
+        vso._get_client = original
+    assert calls == [
+        (vso.DEFAULT_URL, vso.DEFAULT_PORT),
+        ('http://example.org/vso.wsdl', 'x')
+    ]
+
+
 def test_simpleattr_apply():
     a = attr.ValueAttr({('test', ): 1})
     dct = {}
@@ -99,19 +197,23 @@ def test_attror_and():
     assert one == other
 
 
+@pytest.mark.parametrize(("name", "factor"), energy)
+def test_wave_energy_toangstrom(name, factor):
+    w = va.Wave(62 / factor, 62 / factor, name)
+    assert int(w.min) == 199
+
+
+@pytest.mark.parametrize(("name", "factor"), frequency)
+def test_wave_frequency_toangstrom(name, factor):
+    w = va.Wave(1.506e16 / factor, 1.506e16 / factor, name)
+    assert int(w.min) == 199
+
+
 def test_wave_toangstrom():
-    for name, factor in energy:
-        w = va.Wave(62 / factor, 62 / factor, name)
-        assert int(w.min) == 199
-    
     w = va.Wave(62, 62, 'eV')
     assert int(w.min) == 199
     w = va.Wave(62e-3, 62e-3, 'keV')
     assert int(w.min) == 199
-
-    for name, factor in frequency:
-        w = va.Wave(1.506e16 / factor, 1.506e16 / factor, name)
-        assert int(w.min) == 199
     
     w = va.Wave(1.506e16, 1.506e16, 'Hz')
     assert int(w.min) == 199
@@ -145,3 +247,358 @@ def test_wave_xor():
     
     assert a == attr.AttrOr(
         [va.Wave(0, 200), va.Wave(400, 600), va.Wave(800, 1000)])
+
+
+def test_copy_object():
+    from suds.sudsobject import Factory
+    
+    obj = Factory.object('QueryRequest')
+    obj.block = Factory.object('QueryRequestBlock')
+    obj.block.instrument = None
+    obj.block.field = [Factory.object('Field')]
+    
+    copy = vso._copy_object(obj)
+    copy.block.instrument = 'eit'
+    
+    assert obj.block.instrument is None
+    assert copy.block is not obj.block
+    assert copy.block.field[0] is not obj.block.field[0]
+    assert copy.__class__ is obj.__class__
+
+
+def test_time_range():
+    from datetime import datetime
+    from suds.sudsobject import Factory
+    
+    records = []
+    for start, end in [('20110101000000', '20110101000100'),
+                       ('20101231235900', '20110101000000'),
+                       ('20110101000030', '20110101000200')]:
+        record = Factory.object('QueryResponseBlock')
+        record.time = Factory.object('Time', {'start': start, 'end': end})
+        records.append(record)
+    
+    assert vso.QueryResponse(records).time_range() == (
+        datetime(2010, 12, 31, 23, 59), datetime(2011, 1, 1, 0, 2)
+    )
+    pytest.raises(ValueError, vso.QueryResponse([]).time_range)
+
+
+def test_format_time():
+    assert vso._format_time('20110101000130') == '2011-01-01 00:01:30'
+    pytest.raises(ValueError, vso._format_time, '2011010100')
+
+
+def test_parse_waverange():
+    assert vso._parse_waverange('171') == {
+        'wave_wavemin': '171', 'wave_wavemax': '171',
+        'wave_waveunit': 'Angstrom'
+    }
+    assert vso._parse_waverange('171 - 195 nm') == {
+        'wave_wavemin': '171', 'wave_wavemax': '195', 'wave_waveunit': 'nm'
+    }
+    pytest.raises(ValueError, vso._parse_waverange, 'EUV')
+
+
+def test_by_provider():
+    from suds.sudsobject import Factory
+    
+    records = [
+        Factory.object('QueryResponseBlock', {'provider': provider, 'fileid': n})
+        for n, provider in enumerate(['SDAC', 'SDAC', 'JSOC', 'SDAC'])
+    ]
+    map_ = vso.VSOClient.by_provider(records)
+    assert [r.fileid for r in map_['SDAC']] == [0, 1, 3]
+    assert [r.fileid for r in map_['JSOC']] == [2]
+
+
+def test_queryresponse_create():
+    from suds.sudsobject import Factory
+    
+    record = Factory.object('QueryResponseBlock', {'fileid': 'a'})
+    provideritem = Factory.object('ProviderQueryResponse')
+    provideritem.record = Factory.object('QueryResponseBlockArray',
+                                         {'recorditem': [record]})
+    result = Factory.object('QueryResponse', {'provideritem': [provideritem]})
+    
+    response = vso.QueryResponse.create(result)
+    assert response == [record]
+    assert response.queryresult is None
+    assert vso.QueryResponse.create(result, True).queryresult is result
+
+
+def test_get_default_methods(fake_client):
+    from suds.sudsobject import Factory
+    
+    record = Factory.object('QueryResponseBlock', {
+        'provider': 'SDAC', 'fileid': 'a'
+    })
+    fake_client.get(
+        vso.QueryResponse([record]), methods=None, downloader=object()
+    ).wait()
+    fake_client.get(vso.QueryResponse([record]), downloader=object()).wait()
+    
+    first, second = fake_client.api.service.requests
+    assert first.request.method.methodtype == (
+        vso.VSOClient.method_order + ['URL']
+    )
+    assert second.request.method.methodtype == ('URL-FILE', )
+
+
+def _provideritem(provider, fileids):
+    from suds.sudsobject import Factory
+    
+    records = [
+        Factory.object('QueryResponseBlock', {
+            'provider': provider, 'fileid': fileid
+        })
+        for fileid in fileids
+    ]
+    return Factory.object('ProviderQueryResponse', {
+        'provider': provider,
+        'no_of_records_found': len(records),
+        'no_of_records_returned': len(records),
+        'record': Factory.object('QueryResponseBlockArray',
+                                 {'recorditem': records})
+    })
+
+
+def test_merge(fake_client):
+    from suds.sudsobject import Factory
+    
+    first = Factory.object('QueryResponse', {'provideritem': [
+        _provideritem('SDAC', ['a', 'b']), _provideritem('JSOC', ['a'])
+    ]})
+    second = Factory.object('QueryResponse', {'provideritem': [
+        _provideritem('SDAC', ['b', 'c']), _provideritem('JSOC', ['a', 'd'])
+    ]})
+    
+    merged = dict(
+        (item.provider, item)
+        for item in fake_client.merge([first, second]).provideritem
+    )
+    assert sorted(merged) == ['JSOC', 'SDAC']
+    
+    # Fileids are only unique within a provider, so 'a' is kept for both.
+    for provider, fileids in [('SDAC', ['a', 'b', 'c']), ('JSOC', ['a', 'd'])]:
+        item = merged[provider]
+        assert [r.fileid for r in item.record.recorditem] == fileids
+        assert item.no_of_records_found == len(fileids)
+        assert item.no_of_records_returned == len(fileids)
+
+
+def _getdataresponseitem(provider, status, methods, fileids):
+    from suds.sudsobject import Factory
+    
+    return Factory.object('GetDataResponseItem', {
+        'provider': provider,
+        'status': status,
+        'method': Factory.object('MethodTypes', {'methodtype': methods}),
+        'getdataitem': Factory.object('GetDataItem', {'dataitem': [
+            Factory.object('DataItem', {'fileiditem': Factory.object(
+                'FileIdArray', {'fileid': fileids}
+            )})
+        ]})
+    })
+
+
+def test_download_all_retries_grouped(fake_client):
+    from suds.sudsobject import Factory
+    
+    response = Factory.object('VSOGetDataResponse', {'getdataresponseitem': [
+        _getdataresponseitem('SDAC', '300', ['URL-FILE', 'URL-TAR'], ['a']),
+        _getdataresponseitem('JSOC', '300', ['URL-TAR'], ['b', 'c']),
+    ]})
+    res = vso.Results(lambda _: None, 1, lambda mp: [])
+    fake_client.download_all(
+        response, ['URL'], object(), None, {}, res, directories=set()
+    )
+    
+    # Both providers chose the same method, so they are asked again in a
+    # single request.
+    request, = fake_client.api.service.requests
+    assert request.request.method.methodtype == ['URL-TAR']
+    items = request.request.datacontainer.datarequestitem
+    assert sorted(
+        (item.provider, item.fileiditem.fileid) for item in items
+    ) == [('JSOC', [['b', 'c']]), ('SDAC', [['a']])]
+    assert res.errors == []
+
+
+def _query_request(instrument):
+    from suds.sudsobject import Factory
+    
+    return Factory.object('QueryRequest', {'block': Factory.object(
+        'QueryRequestBlock', {'instrument': instrument}
+    )})
+
+
+def test_query_blocks_ordered(fake_client):
+    instruments = ['slow', 'eit', 'aia', 'mdi']
+    responses, errors = fake_client.query_blocks(
+        [_query_request(instrument) for instrument in instruments]
+    )
+    assert errors == []
+    assert [r.provideritem[0].provider for r in responses] == instruments
+    # Every thread queries with its own clone of the client.
+    assert len(fake_client.api.clones) == len(instruments)
+
+
+def test_query_blocks_errors(fake_client):
+    fake_client.max_query_concurrency = 2
+    responses, errors = fake_client.query_blocks(
+        [_query_request(instrument)
+         for instrument in ['eit', 'missing', 'aia', 'broken', 'mdi']]
+    )
+    assert [r.provideritem[0].provider for r in responses] == [
+        'eit', 'aia', 'mdi'
+    ]
+    assert sorted(type(ex).__name__ for ex in errors) == [
+        'TypeNotFound', 'ValueError'
+    ]
+    assert len(fake_client.api.clones) == 2
+
+
+def test_query_batch(fake_client):
+    response = fake_client.query(
+        va.Instrument('eit') | va.Instrument('aia'), batch=True
+    )
+    assert fake_client.api.service.queries == [['eit', 'aia']]
+    assert sorted(record.fileid for record in response) == ['aia', 'eit']
+    assert response.errors == []
+
+
+def test_query_batch_errors(fake_client):
+    query = va.Instrument('eit') | va.Instrument('broken')
+    
+    # Unbatched, the other block still returns its records.
+    response = fake_client.query(query)
+    assert [record.fileid for record in response] == ['eit']
+    assert [type(ex) for ex in response.errors] == [ValueError]
+    
+    response = fake_client.query(query, batch=True)
+    assert list(response) == []
+    assert [type(ex) for ex in response.errors] == [ValueError]
+    assert fake_client.api.service.queries[-1] == ['eit', 'broken']
+
+
+class _FakeClock(object):
+    """ Replaces the time module; every call to time advances it by a
+    second. """
+    def __init__(self):
+        self.now = 0
+    
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+def pytest_funcarg__counting_iclient(request):
+    """ InteractiveVSOClient whose queries return a new, empty
+    QueryResponse and are counted in the calls attribute. The time seen
+    by the client is available as its clock attribute. """
+    client = vso.InteractiveVSOClient(_FakeAPI())
+    client.calls = []
+    
+    original = vso.time
+    client.clock = vso.time = _FakeClock()
+    def teardown():
+        vso.time = original
+    request.addfinalizer(teardown)
+    
+    def query(*args, **kwargs):
+        client.calls.append((args, kwargs))
+        return vso.QueryResponse([])
+    client.query = client.query_legacy = query
+    return client
+
+
+def test_search_cached(counting_iclient, eit):
+    first = counting_iclient.search(eit)
+    assert counting_iclient.search(eit) is first
+    
+    legacy = counting_iclient.search('2011-01-01', '2011-01-02', 'eit')
+    assert counting_iclient.search('2011-01-01', '2011-01-02', 'eit') is legacy
+    assert counting_iclient.search(
+        '2011-01-01', '2011-01-02', instrument='eit'
+    ) is not legacy
+    assert len(counting_iclient.calls) == 3
+
+
+def test_search_cache_ttl(counting_iclient, eit):
+    first = counting_iclient.search(eit)
+    counting_iclient.clock.now += counting_iclient.cache_ttl - 2
+    assert counting_iclient.search(eit) is first
+    counting_iclient.clock.now += 1
+    assert counting_iclient.search(eit) is not first
+    assert len(counting_iclient.calls) == 2
+
+
+def test_search_cache_size(counting_iclient):
+    counting_iclient.cache_size = 2
+    for instrument in ['eit', 'aia', 'eit', 'mdi']:
+        counting_iclient.search(va.Instrument(instrument))
+    assert len(counting_iclient.calls) == 3
+    assert len(counting_iclient._search_cache) == 2
+    
+    # The oldest search was evicted
+    counting_iclient.search(va.Instrument('aia'))
+    assert len(counting_iclient.calls) == 3
+    counting_iclient.search(va.Instrument('eit'))
+    assert len(counting_iclient.calls) == 4
+
+
+def test_search_errors_not_cached(counting_iclient, eit):
+    query = counting_iclient.query
+    def failing_query(*args):
+        response = query(*args)
+        response.errors.append(ValueError('broken'))
+        return response
+    counting_iclient.query = failing_query
+    
+    counting_iclient.search(eit)
+    counting_iclient.search(eit)
+    assert len(counting_iclient.calls) == 2
+
+
+def test_search_clear_cache(counting_iclient, eit):
+    counting_iclient.search(eit)
+    counting_iclient.clear_cache()
+    counting_iclient.search(eit)
+    assert len(counting_iclient.calls) == 2
+
+
+def test_mk_filename_directories():
+    import os
+    import shutil
+    import tempfile
+    from suds.sudsobject import Factory
+    
+    class Sock(object):
+        headers = {}
+    
+    tmp = tempfile.mkdtemp()
+    try:
+        pattern = os.path.join(tmp, '{instrument}', '{file}')
+        record = Factory.object('QueryResponseBlock', {
+            'instrument': 'eit', 'fileid': 'a'
+        })
+        url = 'http://example.org/data/a.fits'
+        directory = os.path.join(tmp, 'eit')
+        
+        directories = set()
+        assert vso.VSOClient.mk_filename(
+            pattern, record, Sock(), url, directories
+        ) == os.path.join(directory, 'a.fits')
+        assert directories == set([directory])
+        
+        # A later call to get starts with a new set, so it creates the
+        # directory again if it was removed in the meantime.
+        shutil.rmtree(directory)
+        vso.VSOClient.mk_filename(pattern, record, Sock(), url, set())
+        assert os.path.isdir(directory)
+        
+        vso.VSOClient.mk_filename(pattern, record, Sock(), url)
+        assert os.path.isdir(directory)
+    finally:
+        shutil.rmtree(tmp)
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 import sunpy.sun as sun
+import numpy as np
 from numpy.testing import assert_array_almost_equal
 
 def test_sunearth_distance():
@@ -12,3 +13,71 @@ def test_sunearth_distance():
     assert_array_almost_equal(sun.sunearth_distance("2006/12/27"), 0.9834, decimal=4)
 
 
+
+def test_array_input():
+    from sunpy.sun.sun import sunearth_distance, heliographic_solar_center
+    times = ["2010/02/04", "2009/04/13", "2008/06/20"]
+    assert_array_almost_equal(sunearth_distance(times),
+                              [sunearth_distance(t) for t in times])
+    assert_array_almost_equal(
+        heliographic_solar_center(times),
+        zip(*[heliographic_solar_center(t) for t in times])
+    )
+    
+    from sunpy.sun.sun import (longitude_Sun_perigee, true_latitude,
+                               apparent_latitude)
+    for func in [longitude_Sun_perigee, true_latitude, apparent_latitude]:
+        assert np.shape(func(times)) == (len(times),)
+        assert_array_almost_equal(func(times), [func(t) for t in times])
+        assert_array_almost_equal(func(np.array(times)),
+                                  [func(t) for t in times])
+
+def test_apparent_rightascenscion():
+    from sunpy.sun.sun import apparent_rightascenscion, apparent_longitude
+    # The right ascension (in hours) stays within a few minutes of the
+    # ecliptic longitude.
+    for t in ["2010/01/01", "2010/03/20", "2010/06/21", "2010/09/23"]:
+        ra = apparent_rightascenscion(t)
+        assert 0 <= ra < 24
+        assert abs(ra - apparent_longitude(t) / 15.0) < 0.2
+
+def test_datetime64_input():
+    import numpy as np
+    from sunpy.sun.sun import carrington_rotation_number, sunearth_distance
+    times = ["2010-02-04T13:20:00", "2001-01-01T00:00:00"]
+    array = np.array(times, dtype='datetime64[s]')
+    for func in [carrington_rotation_number, sunearth_distance]:
+        assert_array_almost_equal(func(array), func(times), decimal=10)
+
+def test_datetime64_solar_cycle_number():
+    import numpy as np
+    from sunpy.sun.sun import solar_cycle_number
+    times = ["1969-12-31T23:59:59", "2010-02-04T13:20:00", "1899-06-01T00:00:00"]
+    array = np.array(times, dtype='datetime64[s]')
+    assert list(solar_cycle_number(array)) == [
+        solar_cycle_number(t) for t in times
+    ]
+
+def test_ephem_cached():
+    from sunpy.sun import sun as ephem
+    t = "2010/02/04"
+    assert ephem._ephem(t) is ephem._ephem(t)
+    assert ephem._ephem(None) is not ephem._ephem(None)
+    assert ephem._ephem([t]) is not ephem._ephem([t])
+
+def test_get_sun_reference():
+    # Values from the IDL get_sun for 2001-01-01 00:00, see the docstring
+    # of sunpy.sun.sun.
+    from sunpy.sun import sun as ephem
+    t = "2001/01/01"
+    assert_array_almost_equal(ephem.sunearth_distance(t), 0.98330468, 7)
+    assert_array_almost_equal(ephem.angular_size(t), 975.92336, 4)
+    assert_array_almost_equal(ephem.true_longitude(t), 280.64366, 5)
+    assert_array_almost_equal(ephem.apparent_longitude(t), 280.63336, 5)
+    assert_array_almost_equal(ephem.true_rightascenscion(t), 18.771741, 5)
+    assert_array_almost_equal(ephem.true_declination(t), -23.012449, 5)
+    assert_array_almost_equal(ephem.apparent_rightascenscion(t), 18.770994, 5)
+    assert_array_almost_equal(ephem.apparent_declination(t), -23.012593, 5)
+    assert_array_almost_equal(ephem.heliographic_solar_center(t),
+                              [217.31269, -3.0416292], 5)
+    assert_array_almost_equal(ephem.solar_north(t), 2.0102649, 5)
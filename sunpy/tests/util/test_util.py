@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import pytest
+
 from datetime import datetime
 from sunpy.util import util
 from numpy.testing import assert_almost_equal
@@ -43,12 +45,35 @@ def test_anytim_ISO():
     for k, v in lst:
         assert util.anytim(k) == v
 
+def test_anytim_unpadded():
+    # Not matched by the regular expressions, so parsed by strptime
+    assert util.anytim('1966/2/3') == LANDING
+    assert util.anytim('2007-05-04T21:08:12.5Z') == datetime(
+        2007, 5, 4, 21, 8, 12, 500000
+    )
+    assert util.anytim('2007-may-04') == datetime(2007, 5, 4)
+
+def test_anytim_trailing_newline():
+    pytest.raises(ValueError, util.anytim, '2007-05-04\n')
+
 def test_julian_day():
     assert util.julian_day('1900-01-01 12:00') == 2415021.0
     assert util.julian_day(LANDING) == 2439159.5
     result = util.julian_day('2000-03-01 15:30:26')
     assert_almost_equal(result, 2451605.1461111, decimal=3)
 
+def test_julian_centuries():
+    # 1900 January 0.5 is noon on December 31 1899
+    assert util.julian_centuries((1899, 12, 31, 12)) == 0
+    # J2000.0 is exactly one Julian century later
+    assert util.julian_centuries('2000-01-01 12:00') == 1.0
+
+def test_julian_day_cached():
+    first = util.julian_day('2000-03-01 15:30:26')
+    assert util._JULIAN_DAY_CACHE['2000-03-01 15:30:26'] == first
+    assert util.julian_day('2000-03-01 15:30:26') == first
+    assert util.julian_day((2000, 3, 1, 15, 30, 26)) == first
+
     
 def test_break_time():
     assert util.break_time(datetime(2007, 5, 4, 21, 8, 12)) == '20070504_210812'
@@ -16,6 +16,7 @@ __all__ = ["toggle_pylab", "anytim", "julian_day", "julian_centuries",
            "to_angstrom"]
 
 from matplotlib import pyplot
+import re
 from datetime import datetime
 from datetime import timedelta
 import numpy as np
@@ -24,6 +25,16 @@ from itertools import izip, imap
 # The number of days between Jan 1 1900 and the Julian reference date of 
 # 12:00 noon Jan 1, 4713 BC
 JULIAN_DAY_ON_NOON01JAN1900 = 2415021.0
+JULIAN_REF_DAY = datetime(1900, 1, 1, 12)
+
+# The Julian day of 1900 January 0.5 (noon Dec 31 1899), the epoch from
+# which julian_centuries counts, and the number of days in a Julian century
+JULIAN_DAY_ON_NOON31DEC1899 = 2415020.0
+DAYS_IN_JULIAN_CENTURY = 36525.0
+
+# Results of julian_day by time
+_JULIAN_DAY_CACHE = {}
+_JULIAN_DAY_CACHE_SIZE = 1024
 
 def toggle_pylab(fn):
     """ A decorator to prevent functions from opening matplotlib windows
@@ -43,6 +54,75 @@ def toggle_pylab(fn):
     else:
         return fn
 
+TIME_FORMAT_LIST = [
+    "%Y-%m-%dT%H:%M:%S.%f",    # Example 2007-05-04T21:08:12.999999
+    "%Y/%m/%dT%H:%M:%S.%f",    # Example 2007/05/04T21:08:12.999999
+    "%Y%m%dT%H%M%S.%f",        # Example 20070504T210812.999999
+    "%Y/%m/%d %H:%M:%S",       # Example 2007/05/04 21:08:12
+    "%Y/%m/%d %H:%M",          # Example 2007/05/04 21:08
+    "%Y/%m/%d %H:%M:%S.%f",    # Example 2007/05/04 21:08:12.999999
+    "%Y-%m-%d %H:%M:%S.%f",    # Example 2007-05-04 21:08:12.999999
+    "%Y-%m-%dT%H:%M:%S.%fZ",   # Example 2007-05-04T21:08:12.999Z
+    "%Y-%m-%d %H:%M:%S",       # Example 2007-05-04 21:08:12
+    "%Y-%m-%dT%H:%M:%S",       # Example 2007-05-04T21:08:12
+    "%Y-%m-%d %H:%M",          # Example 2007-05-04 21:08
+    "%Y%m%dT%H%M%S",           # Example 20070504T210812
+    "%Y-%b-%d %H:%M:%S",       # Example 2007-May-04 21:08:12
+    "%Y-%b-%d %H:%M",          # Example 2007-May-04 21:08
+    "%Y-%b-%d",                # Example 2007-May-04
+    "%Y-%m-%d",                # Example 2007-05-04
+    "%Y/%m/%d",                # Example 2007/05/04
+    "%Y%m%d_%H%M%S"            # Example 20070504_210812
+]
+
+# Regular expressions for the strptime directives used above, matching
+# their usual, zero-padded form.
+_TIME_FIELDS = {
+    'Y': r'(?P<Y>\d{4})',
+    'm': r'(?P<m>\d{2})',
+    'b': r'(?P<b>[A-Za-z]{3})',
+    'd': r'(?P<d>\d{2})',
+    'H': r'(?P<H>\d{2})',
+    'M': r'(?P<M>\d{2})',
+    'S': r'(?P<S>\d{2})',
+    'f': r'(?P<f>\d{1,6})',
+}
+_MONTHS = dict(
+    (name, n + 1) for n, name in enumerate([
+        'jan', 'feb', 'mar', 'apr', 'may', 'jun',
+        'jul', 'aug', 'sep', 'oct', 'nov', 'dec'
+    ])
+)
+
+def _format_regex(time_format):
+    """Return a compiled regular expression matching the times strptime
+    parses with time_format when all fields are zero-padded."""
+    parts = re.split('%(.)', time_format)
+    # re.split puts the directives at odd indices.
+    return re.compile(''.join(
+        _TIME_FIELDS[part] if n % 2 else re.escape(part)
+        for n, part in enumerate(parts)
+    ) + r'\Z')
+
+_TIME_REGEXES = [_format_regex(fmt) for fmt in TIME_FORMAT_LIST]
+
+def _match_to_datetime(match):
+    """Return the datetime for a match of one of _TIME_REGEXES."""
+    fields = match.groupdict()
+    if 'b' in fields:
+        month = _MONTHS[fields['b'].lower()]
+    else:
+        month = int(fields['m'])
+    # Like strptime, take a fraction of a second with fewer than six
+    # digits as padded on the right.
+    microsecond = fields.get('f')
+    return datetime(
+        int(fields['Y']), month, int(fields['d']),
+        int(fields.get('H') or 0), int(fields.get('M') or 0),
+        int(fields.get('S') or 0),
+        int(microsecond.ljust(6, '0')) if microsecond else 0
+    )
+
 def anytim(time_string=None):
     """Given a time string will parse and return a datetime object.
     If no string is given then returns the datetime object for the current time.
@@ -61,26 +141,18 @@ def anytim(time_string=None):
     elif isinstance(time_string, int) or isinstance(time_string, float):
         return datetime(1979, 1, 1) + timedelta(0, time_string)
     else:
-        time_format_list = \
-            ["%Y-%m-%dT%H:%M:%S.%f",    # Example 2007-05-04T21:08:12.999999
-             "%Y/%m/%dT%H:%M:%S.%f",    # Example 2007/05/04T21:08:12.999999
-             "%Y%m%dT%H%M%S.%f",        # Example 20070504T210812.999999
-             "%Y/%m/%d %H:%M:%S",       # Example 2007/05/04 21:08:12
-             "%Y/%m/%d %H:%M",          # Example 2007/05/04 21:08
-             "%Y/%m/%d %H:%M:%S.%f",    # Example 2007/05/04 21:08:12.999999
-             "%Y-%m-%d %H:%M:%S.%f",    # Example 2007-05-04 21:08:12.999999
-             "%Y-%m-%dT%H:%M:%S.%fZ",   # Example 2007-05-04T21:08:12.999Z
-             "%Y-%m-%d %H:%M:%S",       # Example 2007-05-04 21:08:12
-             "%Y-%m-%dT%H:%M:%S",       # Example 2007-05-04T21:08:12
-             "%Y-%m-%d %H:%M",          # Example 2007-05-04 21:08
-             "%Y%m%dT%H%M%S",           # Example 20070504T210812
-             "%Y-%b-%d %H:%M:%S",       # Example 2007-May-04 21:08:12
-             "%Y-%b-%d %H:%M",          # Example 2007-May-04 21:08
-             "%Y-%b-%d",                # Example 2007-May-04
-             "%Y-%m-%d",                # Example 2007-05-04
-             "%Y/%m/%d",                # Example 2007/05/04
-             "%Y%m%d_%H%M%S"]           # Example 20070504_210812
-        for time_format in time_format_list: 
+        # Try the formats as regular expressions first, as a failing
+        # strptime is expensive. Anything unusual, such as single digit
+        # months or extra whitespace, is left to strptime.
+        for regex in _TIME_REGEXES:
+            match = regex.match(time_string)
+            if match is not None:
+                try:
+                    return _match_to_datetime(match)
+                except (KeyError, ValueError):
+                    break
+        
+        for time_format in TIME_FORMAT_LIST: 
             try: 
                 return datetime.strptime(time_string, time_format)
             except ValueError:
@@ -95,7 +167,11 @@ def julian_day(t=None):
     # Good online reference for fractional julian day
     # http://www.stevegs.com/jd_calc/jd_calc.htm
     
-    JULIAN_REF_DAY = anytim('1900/1/1 12:00:00')
+    try:
+        return _JULIAN_DAY_CACHE[t]
+    except (KeyError, TypeError):
+        pass
+    
     time = anytim(t)
     
     tdiff = time - JULIAN_REF_DAY
@@ -112,13 +188,19 @@ def julian_day(t=None):
     else:
         result = result + 0.5
 
+    # Parsing the time is the expensive part, so remember the result for
+    # anything but the current time.
+    if isinstance(t, (basestring, datetime, tuple)):
+        if len(_JULIAN_DAY_CACHE) >= _JULIAN_DAY_CACHE_SIZE:
+            _JULIAN_DAY_CACHE.clear()
+        _JULIAN_DAY_CACHE[t] = result
+
     return result
 
 def julian_centuries(t=None):
     """Returns the number of Julian centuries since 1900 January 0.5."""
-    DAYS_IN_YEAR = 36525.0
-
-    result = (julian_day(t) - JULIAN_DAY_ON_NOON01JAN1900) / DAYS_IN_YEAR
+    result = ((julian_day(t) - JULIAN_DAY_ON_NOON31DEC1899) /
+              DAYS_IN_JULIAN_CENTURY)
     return result
 
 def day_of_year(t=None):